@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: per-reel footprint of the pipeline's intermediate data
+
+Compares the old nested-dict pipeline (article -> script_data -> audio_data ->
+video_data -> reel dict) with the typed records in services.models, using
+synthetic data so no API keys are needed.
+
+Usage: python benchmark_memory.py [reel_count]
+"""
+
+import gc
+import json
+import sys
+import tracemalloc
+
+from services.models import Article, AudioAsset, Reel, Script, VideoClip
+
+SCRIPT_TEXT = " ".join(["Narrator: word"] * 80 + ["Scene: city skyline at night"] * 4)
+NARRATOR_TEXT = " ".join(["word"] * 150)
+SCENES = ["city skyline at night", "people walking", "news broadcast", "business meeting"]
+
+
+def raw_article(i: int) -> dict:
+    return {
+        'title': f"Headline number {i} about something important",
+        'description': f"Description {i} " + "lorem ipsum " * 20,
+        'content': f"Content {i} " + "dolor sit amet " * 40,
+        'url': f"https://example.com/news/{i}",
+        'urlToImage': f"https://example.com/img/{i}.jpg",
+        'publishedAt': "2024-08-03T10:00:00Z",
+        'source': {'name': "Example News"},
+        'author': "Reporter"
+    }
+
+
+def raw_video(i: int, prompt: str) -> dict:
+    return {
+        'id': i,
+        'url': f"https://videos.pexels.com/video-files/{i}/hd.mp4",
+        'width': 1080,
+        'height': 1920,
+        'duration': 15,
+        'prompt': prompt,
+        'thumbnail': f"https://images.pexels.com/videos/{i}/thumb.jpg",
+        'user': "Videographer",
+        'description': f"https://www.pexels.com/video/{i}/"
+    }
+
+
+def build_legacy(count: int) -> list:
+    """
+    Reproduce the previous pipeline: each stage wraps the last stage's dict
+    """
+    articles = []
+    for i in range(count):
+        raw = raw_article(i)
+        articles.append({
+            'title': raw['title'],
+            'description': raw['description'],
+            'content': raw.get('content', ''),
+            'url': raw['url'],
+            'urlToImage': raw.get('urlToImage', ''),
+            'publishedAt': raw.get('publishedAt', ''),
+            'source': raw.get('source', {}).get('name', 'Unknown'),
+            'author': raw.get('author', 'Unknown')
+        })
+
+    scripts = [{
+        'article': article,
+        'script_data': {
+            'script': SCRIPT_TEXT + article['title'],
+            'scenes': list(SCENES),
+            'narrator_text': NARRATOR_TEXT + article['title'],
+            'word_count': 150,
+            'estimated_duration': '60 seconds'
+        }
+    } for article in articles]
+
+    audio_results = []
+    for item in scripts:
+        audio_data = {
+            'audio_url': f"/static/audio/audio_{id(item)}.mp3",
+            'audio_path': f"static/audio/audio_{id(item)}.mp3",
+            'duration': 60.0,
+            'voice_id': "21m00Tcm4TlvDq8ikWAM",
+            'text_length': len(item['script_data']['narrator_text'])
+        }
+        audio_results.append({
+            'article': item['article'],
+            'script_data': item['script_data'],
+            'audio_data': audio_data
+        })
+
+    video_results = []
+    for n, item in enumerate(audio_results):
+        videos = [raw_video(n * 10 + k, prompt) for k, prompt in enumerate(SCENES)]
+        video_results.append({
+            'article': item['article'],
+            'script_data': item['script_data'],
+            'video_data': {
+                'script_data': item['script_data'],
+                'videos': videos,
+                'scene_count': len(SCENES),
+                'video_count': len(videos)
+            }
+        })
+
+    reels = []
+    for result in video_results:
+        reels.append({
+            'article': result['article'],
+            'script': result['script_data'],
+            'audio': result['script_data'].get('audio_data'),
+            'videos': result['video_data']['videos'],
+            'reel_data': {
+                'title': result['article']['title'],
+                'description': result['article']['description'],
+                'script': result['script_data']['script'],
+                'audio_url': result['script_data'].get('audio_data', {}).get('audio_url'),
+                'video_urls': [v['url'] for v in result['video_data']['videos']],
+                'duration': result['script_data'].get('estimated_duration', '60 seconds')
+            }
+        })
+    return reels
+
+
+def build_records(count: int) -> list:
+    """
+    Build the same reels with the typed records used by the pipeline now
+    """
+    reels = []
+    for i in range(count):
+        article = Article.from_newsapi(raw_article(i))
+        script = Script(
+            text=SCRIPT_TEXT + article.title,
+            scenes=tuple(SCENES),
+            narrator_text=NARRATOR_TEXT + article.title,
+            word_count=150
+        )
+        reel = Reel(article=article, script=script)
+        reel.audio = AudioAsset(
+            audio_url=f"/static/audio/audio_{id(reel)}.mp3",
+            audio_path=f"static/audio/audio_{id(reel)}.mp3",
+            duration=60.0,
+            voice_id="21m00Tcm4TlvDq8ikWAM",
+            text_length=len(script.narrator_text)
+        )
+        reel.videos = [VideoClip(**raw_video(i * 10 + k, prompt)) for k, prompt in enumerate(SCENES)]
+        reels.append(reel)
+    return reels
+
+
+def measure(builder, count: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = builder(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    print(f"📏 Measuring pipeline memory for {count} reels...")
+    print("=" * 50)
+
+    legacy_bytes = measure(build_legacy, count)
+    record_bytes = measure(build_records, count)
+
+    legacy_json = len(json.dumps(build_legacy(count)))
+    record_json = len(json.dumps([reel.to_dict() for reel in build_records(count)]))
+
+    print(f"Nested dicts:  {legacy_bytes / count:10.0f} bytes/reel in memory")
+    print(f"Typed records: {record_bytes / count:10.0f} bytes/reel in memory")
+    print(f"Saving:        {100 * (1 - record_bytes / legacy_bytes):10.1f} %")
+    print(f"\nSerialized response: {legacy_json / count:.0f} vs {record_json / count:.0f} bytes/reel")
+
+
+if __name__ == "__main__":
+    main()
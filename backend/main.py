@@ -1,9 +1,13 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Set
+import asyncio
+import math
 import os
+import re
 from dotenv import load_dotenv
 
 # Import our services
@@ -12,6 +16,14 @@ try:
     from services.script_service import ScriptService
     from services.audio_service import AudioService
     from services.video_service import VideoService
+    from services.deadline import MAX_BUDGET_SECONDS, Deadline, DeadlineExceeded
+    from services.models import Article, Reel
+    from services.responses import json_response, parse_projection, project_reels, rendition_target, ranged_file_response
+    from services.media_cache import MediaCache
+    from services.batch import batch_response, run_batch
+    from services.tracing import Tracer, annotate, span
+    from services.admission import AdmissionController, Overloaded
+    from services.profiling import LoopBlockDetector, Profiler
     SERVICES_AVAILABLE = True
 except ImportError:
     SERVICES_AVAILABLE = False
@@ -25,15 +37,52 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"]
-,  
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Default time budget for pipeline endpoints (seconds)
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("REEL_DEADLINE_SECONDS", "45"))
+MAX_DEADLINE_SECONDS = MAX_BUDGET_SECONDS
+
+# Stream scripts from Gemini and start each scene's video search as soon as it is written
+STREAM_SCRIPTS = os.getenv("STREAM_SCRIPTS", "true").lower() == "true"
+
+# Prefetch videos for article keywords while the script is still being generated
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "false").lower() == "true"
+
+# Batch endpoint limits
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100"))
+MAX_MATRIX_MARKETS = int(os.getenv("MAX_MATRIX_MARKETS", "60"))
+
+# Request tracing: sampled span export plus a log of every slow request
+TRACING = os.getenv("TRACING", "true").lower() == "true"
+UNTRACED_PREFIXES = ("/health", "/static", "/media")
+
+# Admission control: bounded concurrent pipelines plus a bounded wait queue
+MAX_CONCURRENT_PIPELINES = int(os.getenv("MAX_CONCURRENT_PIPELINES", "4"))
+MAX_QUEUED_PIPELINES = int(os.getenv("MAX_QUEUED_PIPELINES", "16"))
+MAX_QUEUE_SECONDS = float(os.getenv("MAX_QUEUE_SECONDS", "10"))
+ADMISSION_PATHS = {
+    "/generate-reel",
+    "/generate-reel/matrix",
+    "/trending-reels",
+    "/generate-script/batch",
+    "/generate-audio/batch",
+    "/fetch-videos/batch"
+}
+# Single upstream calls get a separate, smaller budget so they cannot starve pipelines
+MAX_CONCURRENT_CALLS = int(os.getenv("MAX_CONCURRENT_CALLS", "8"))
+MAX_QUEUED_CALLS = int(os.getenv("MAX_QUEUED_CALLS", "16"))
+CALL_ADMISSION_PATHS = {
+    "/news",
+    "/generate-script",
+    "/generate-audio",
+    "/fetch-videos"
+}
+
+# Opt-in profiling: X-Profile with the admin token, or a random share of requests
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Log the loop's stack whenever a callback blocks it for longer than this (0 = off)
+LOOP_BLOCK_MS = float(os.getenv("LOOP_BLOCK_MS", "0"))
 
 # Mount static files for audio
 os.makedirs("static/audio", exist_ok=True)
@@ -46,10 +95,127 @@ if SERVICES_AVAILABLE:
         script_service = ScriptService()
         audio_service = AudioService()
         video_service = VideoService()
+        
+        # Optional local cache of Pexels videos served from /media/video
+        media_cache = None
+        if os.getenv("MEDIA_CACHE", "false").lower() == "true":
+            media_cache = MediaCache(
+                directory=os.getenv("MEDIA_CACHE_DIR", "data/media"),
+                max_bytes=int(os.getenv("MEDIA_CACHE_MAX_MB", "2048")) * 1024 * 1024
+            )
+        
+        admission = AdmissionController(
+            max_concurrent=MAX_CONCURRENT_PIPELINES,
+            max_queue=MAX_QUEUED_PIPELINES,
+            max_queue_seconds=MAX_QUEUE_SECONDS
+        )
+        call_admission = AdmissionController(
+            max_concurrent=MAX_CONCURRENT_CALLS,
+            max_queue=MAX_QUEUED_CALLS,
+            max_queue_seconds=MAX_QUEUE_SECONDS
+        )
+        
+        profiler = None
+        if PROFILE_ADMIN_TOKEN or PROFILE_SAMPLE_RATE > 0:
+            profiler = Profiler(
+                directory=os.getenv("PROFILE_DIR", "logs/profiles"),
+                admin_token=PROFILE_ADMIN_TOKEN,
+                sample_rate=PROFILE_SAMPLE_RATE,
+                interval_seconds=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+            )
+        
+        loop_block_detector = LoopBlockDetector(LOOP_BLOCK_MS / 1000) if LOOP_BLOCK_MS > 0 else None
+        
+        tracer = None
+        if TRACING:
+            tracer = Tracer(
+                export_path=os.getenv("TRACE_EXPORT_PATH", "logs/traces.jsonl"),
+                sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.1")),
+                slow_threshold_seconds=float(os.getenv("SLOW_REQUEST_SECONDS", "20")),
+                slow_log_path=os.getenv("SLOW_REQUEST_LOG_PATH", "logs/slow_requests.jsonl")
+            )
     except Exception as e:
         print(f"Error initializing services: {e}")
         SERVICES_AVAILABLE = False
 
+@app.on_event("startup")
+async def start_loop_block_detector():
+    if SERVICES_AVAILABLE and loop_block_detector is not None:
+        loop_block_detector.start()
+
+@app.on_event("shutdown")
+async def stop_loop_block_detector():
+    if SERVICES_AVAILABLE and loop_block_detector is not None:
+        loop_block_detector.stop()
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """
+    Sample stacks for the whole request when it is picked for profiling, saving a folded-stack file
+    """
+    if not SERVICES_AVAILABLE or profiler is None or not profiler.wants(request.headers.get("x-profile")):
+        return await call_next(request)
+
+    sampler = profiler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        path = profiler.finish(sampler, f"{request.method} {request.url.path}")
+    if path:
+        response.headers["X-Profile-File"] = os.path.basename(path)
+    return response
+
+@app.middleware("http")
+async def admit_pipelines(request: Request, call_next):
+    """
+    Queue or shed requests that call upstream providers so overload degrades into fast 503s
+    """
+    if not SERVICES_AVAILABLE:
+        return await call_next(request)
+    if request.url.path in ADMISSION_PATHS:
+        controller = admission
+    elif request.url.path in CALL_ADMISSION_PATHS:
+        controller = call_admission
+    else:
+        return await call_next(request)
+
+    try:
+        async with controller.admit() as queue_seconds:
+            annotate(queue_seconds=round(queue_seconds, 3))
+            return await call_next(request)
+    except Overloaded as e:
+        print(f"🚦 Shedding {request.url.path}: {e} (retry after {e.retry_after}s)")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": str(e), "retry_after": e.retry_after},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Wrap each API request in a trace and return its id in X-Trace-Id
+    """
+    if not SERVICES_AVAILABLE or tracer is None or request.url.path.startswith(UNTRACED_PREFIXES):
+        return await call_next(request)
+
+    with tracer.trace(f"{request.method} {request.url.path}", query=str(request.url.query)) as root:
+        response = await call_next(request)
+        root.set(status_code=response.status_code)
+        response.headers["X-Trace-Id"] = root.trace.trace_id
+        return response
+
+# Add CORS middleware last so it wraps the hooks above, including their 503s
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:3000"]
+,  
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Trace-Id", "ETag"],
+)
+
 # Pydantic models
 class NewsRequest(BaseModel):
     category: Optional[str] = "general"
@@ -64,14 +230,236 @@ class ScriptRequest(BaseModel):
 class AudioRequest(BaseModel):
     script: str
     voice: Optional[str] = "default"
+    chunked: Optional[bool] = None
 
 class VideoRequest(BaseModel):
     prompts: List[str]
 
+class ScriptBatchRequest(BaseModel):
+    items: List[ScriptRequest]
+
+class AudioBatchRequest(BaseModel):
+    items: List[AudioRequest]
+
+class VideoBatchRequest(BaseModel):
+    items: List[VideoRequest]
+
 class ReelRequest(BaseModel):
     category: Optional[str] = "general"
     country: Optional[str] = "us"
     count: Optional[int] = 5
+    timeout_seconds: Optional[float] = None
+
+class MatrixRequest(BaseModel):
+    categories: List[str]
+    countries: List[str]
+    count: Optional[int] = 5
+    timeout_seconds: Optional[float] = None
+
+# Per-item workers shared by single and batch endpoints
+async def _script_item(item: ScriptRequest) -> dict:
+    script = await script_service.generate_reel_script(
+        news_title=item.news_title,
+        news_content=item.news_content,
+        news_url=item.news_url
+    )
+    return script.to_dict()
+
+async def _audio_item(item: AudioRequest) -> dict:
+    audio = await audio_service.generate_audio(item.script, chunked=item.chunked)
+    return audio.to_dict()
+
+async def _videos_item(item: VideoRequest, exclude: Optional[Set[int]] = None) -> dict:
+    videos = await video_service.fetch_videos(item.prompts, exclude=exclude)
+    return {"videos": [video.to_dict() for video in videos], "count": len(videos)}
+
+async def _run_batch_endpoint(items: list, worker, x_request_timeout: Optional[str], prepare=None) -> dict:
+    """
+    Validate a batch, then run worker over it with bounded concurrency within the request deadline
+
+    prepare, if given, is awaited with the deadline before any item runs.
+    """
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_SIZE} items)")
+
+    deadline = _resolve_deadline(header_timeout=x_request_timeout)
+    if prepare:
+        await prepare(deadline)
+    results = await run_batch(items, worker, concurrency=BATCH_CONCURRENCY, deadline=deadline)
+    return batch_response(results)
+
+# Pipeline helpers
+def _resolve_deadline(body_timeout: Optional[float] = None, header_timeout: Optional[str] = None) -> "Deadline":
+    """
+    Build the request deadline from the body field, the X-Request-Timeout header or the server default
+    """
+    budget = DEFAULT_DEADLINE_SECONDS
+    if body_timeout is not None:
+        budget = body_timeout
+    elif header_timeout:
+        try:
+            budget = float(header_timeout)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Request-Timeout must be a number of seconds")
+    if not math.isfinite(budget) or budget <= 0:
+        raise HTTPException(status_code=400, detail="Request timeout must be a positive number of seconds")
+    return Deadline(min(budget, MAX_DEADLINE_SECONDS))
+
+def _article_status(article: "Article") -> dict:
+    return {
+        'title': article.title,
+        'url': article.url,
+        'status': 'success',
+        'stage': None,
+        'error': None
+    }
+
+async def _build_reel(article: "Article", deadline: "Deadline", status: dict, used_videos: set) -> "Reel":
+    """
+    Run script → audio → videos for one article, recording the stage reached in status
+
+    used_videos is shared by every reel in the request so each gets different clips where possible.
+    """
+    speculative = None
+    if SPECULATIVE_PREFETCH:
+        speculative = video_service.speculative_prefetch(article)
+
+    status['stage'] = 'script'
+    on_scene = None
+    if STREAM_SCRIPTS:
+        on_scene = video_service.prefetch_video
+    with span('stage.script'):
+        script = await script_service.generate_reel_script(
+            news_title=article.title,
+            news_content=article.description,
+            news_url=article.url,
+            deadline=deadline,
+            on_scene=on_scene
+        )
+    reel = Reel(article=article, script=script)
+
+    status['stage'] = 'audio'
+    deadline.check("audio generation")
+    with span('stage.audio'):
+        reel.audio = await audio_service.generate_audio_for_script(script, deadline=deadline)
+
+    status['stage'] = 'videos'
+    deadline.check("video fetching")
+    with span('stage.videos', scenes=len(script.scenes)) as videos_span:
+        reel.videos = await video_service.fetch_videos_for_script(
+            script, deadline=deadline, exclude=used_videos, speculative=speculative
+        )
+        videos_span.set(clips=len(reel.videos))
+
+    return reel
+
+async def _run_reel_pipeline(articles: List["Article"], deadline: "Deadline") -> tuple:
+    """
+    Build reels for the articles, BATCH_CONCURRENCY at a time, until the deadline
+
+    Returns the completed reels in article order plus per-article status.
+    """
+    statuses = [_article_status(article) for article in articles]
+    used_videos = set()
+
+    async def build(index: int) -> "Reel":
+        article = articles[index]
+        # A failure or timeout marks the span as an error; run_batch logs it
+        with span('article', title=article.title, source=article.source) as article_span:
+            reel = await _build_reel(article, deadline, statuses[index], used_videos)
+            statuses[index]['stage'] = 'done'
+            article_span.set(status='success', stage='done')
+            return reel
+
+    results = await run_batch(list(range(len(articles))), build, concurrency=BATCH_CONCURRENCY, deadline=deadline)
+
+    reels = []
+    for result, status in zip(results, statuses):
+        if result['status'] == 'success':
+            reels.append(result['result'])
+        elif result['status'] == 'timeout' and status['stage'] is None:
+            # The budget ran out while the article waited for a slot
+            status['status'] = 'skipped'
+            status['error'] = 'Deadline exceeded before processing started'
+        else:
+            status['status'] = result['status']
+            status['error'] = result['error']
+
+    return reels, statuses
+
+def _story_key(article: "Article") -> str:
+    """
+    Title with case and punctuation removed, so one story syndicated under different URLs matches
+
+    Words are Unicode, so non-Latin titles keep their text; a title with no
+    words at all gives '' and must not be matched on.
+    """
+    return ' '.join(re.findall(r"\w+", (article.title or '').casefold()))
+
+def _dedupe_markets(market_articles: List[List["Article"]]) -> tuple:
+    """
+    Merge the articles of every market into unique stories
+
+    Returns (unique articles, per-market lists of indexes into them). Stories
+    match on URL or normalized title.
+    """
+    unique = []
+    by_url = {}
+    by_title = {}
+    market_indexes = []
+    for articles in market_articles:
+        indexes = []
+        for article in articles:
+            title_key = _story_key(article)
+            index = by_url.get(article.url) if article.url else None
+            if index is None and title_key:
+                index = by_title.get(title_key)
+            if index is None:
+                index = len(unique)
+                unique.append(article)
+            if article.url:
+                by_url.setdefault(article.url, index)
+            if title_key:
+                by_title.setdefault(title_key, index)
+            if index not in indexes:
+                indexes.append(index)
+        market_indexes.append(indexes)
+    return unique, market_indexes
+
+def _media_url(url: str) -> str:
+    """
+    Point reel media at our /media routes: generated audio always, Pexels videos when the media cache is on
+    """
+    if url.startswith("/static/audio/"):
+        return "/media/audio/" + url[len("/static/audio/"):]
+    if media_cache is not None and url.startswith("http"):
+        return f"/media/video/{media_cache.register(url)}"
+    return url
+
+def _reel_response(reels: List["Reel"], statuses: List[dict], deadline: "Deadline",
+                   view: str = "full", fields: Optional[List[str]] = None,
+                   target_width: Optional[int] = None) -> dict:
+    """
+    Serialize pipeline results into the API response - the only place reels become dicts
+    """
+    response = {
+        "reels": project_reels(reels, view, fields, target_width, _media_url),
+        "count": len(reels),
+        "status": "success" if len(reels) == len(statuses) else "partial"
+    }
+    if view == "feed":
+        return response
+
+    response["articles"] = statuses
+    if fields is None:
+        # Timing changes on every call, so projected views leave it out to keep ETags stable
+        response["deadline"] = {
+            "budget_seconds": deadline.budget_seconds,
+            "elapsed_seconds": deadline.elapsed()
+        }
+    return response
 
 # Health check endpoint
 @app.get("/")
@@ -80,7 +468,14 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "message": "API is operational"}
+    health = {"status": "healthy", "message": "API is operational"}
+    if SERVICES_AVAILABLE:
+        health["admission"] = admission.stats()
+        health["call_admission"] = call_admission.stats()
+        health["videos"] = video_service.stats()
+        if loop_block_detector is not None:
+            health["event_loop"] = loop_block_detector.stats()
+    return health
 
 # Test endpoint that works without API keys
 @app.get("/test-reels")
@@ -146,7 +541,7 @@ async def get_news(request: NewsRequest):
             country=request.country,
             page_size=request.page_size
         )
-        return {"articles": articles, "count": len(articles)}
+        return {"articles": [article.to_dict() for article in articles], "count": len(articles)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -160,12 +555,7 @@ async def generate_script(request: ScriptRequest):
         raise HTTPException(status_code=503, detail="Script service not available - API keys required")
     
     try:
-        script_data = await script_service.generate_reel_script(
-            news_title=request.news_title,
-            news_content=request.news_content,
-            news_url=request.news_url
-        )
-        return script_data
+        return await _script_item(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -179,8 +569,7 @@ async def generate_audio(request: AudioRequest):
         raise HTTPException(status_code=503, detail="Audio service not available - API keys required")
     
     try:
-        audio_data = await audio_service.generate_audio(request.script)
-        return audio_data
+        return await _audio_item(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -194,16 +583,60 @@ async def fetch_videos(request: VideoRequest):
         raise HTTPException(status_code=503, detail="Video service not available - API keys required")
     
     try:
-        videos = await video_service.fetch_videos(request.prompts)
-        return {"videos": videos, "count": len(videos)}
+        return await _videos_item(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Batch endpoints: one round trip for many items, with per-item results
+@app.post("/generate-script/batch")
+async def generate_script_batch(request: ScriptBatchRequest, x_request_timeout: Optional[str] = Header(None)):
+    """
+    Generate scripts for many stories in one call
+    """
+    if not SERVICES_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Script service not available - API keys required")
+    
+    return await _run_batch_endpoint(request.items, _script_item, x_request_timeout)
+
+@app.post("/generate-audio/batch")
+async def generate_audio_batch(request: AudioBatchRequest, x_request_timeout: Optional[str] = Header(None)):
+    """
+    Generate voice-overs for many scripts in one call
+    """
+    if not SERVICES_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Audio service not available - API keys required")
+    
+    return await _run_batch_endpoint(request.items, _audio_item, x_request_timeout)
+
+@app.post("/fetch-videos/batch")
+async def fetch_videos_batch(request: VideoBatchRequest, x_request_timeout: Optional[str] = Header(None)):
+    """
+    Fetch videos for many prompt lists in one call
+    """
+    if not SERVICES_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Video service not available - API keys required")
+    
+    # Search every prompt in the batch once up front, then hand items sharing a prompt different clips
+    used = set()
+    
+    async def prepare(deadline: "Deadline"):
+        await video_service.search_prompts([prompt for item in request.items for prompt in item.prompts], deadline=deadline)
+    
+    async def worker(item: VideoRequest) -> dict:
+        return await _videos_item(item, exclude=used)
+    
+    return await _run_batch_endpoint(request.items, worker, x_request_timeout, prepare=prepare)
+
 # Complete pipeline endpoint
 @app.post("/generate-reel")
-async def generate_reel(request: ReelRequest):
+async def generate_reel(request: ReelRequest, http_request: Request, view: Optional[str] = None,
+                        fields: Optional[str] = None, device_width: Optional[int] = None,
+                        network: Optional[str] = None, x_request_timeout: Optional[str] = Header(None)):
     """
     Complete pipeline: News → Script → Audio → Videos
+
+    Use ?view=feed for the flat feed shape or ?fields=reel_data,videos to return only some reel fields.
+    ?device_width= and ?network= (or client hint headers) pick the video rendition to return.
     """
     if not SERVICES_AVAILABLE:
         # Return test reel instead
@@ -226,100 +659,199 @@ async def generate_reel(request: ReelRequest):
             "message": "Test reel generated (API keys required for real generation)"
         }
     
+    view, selected_fields = parse_projection(view, fields)
+    target_width = rendition_target(http_request, device_width, network)
+    deadline = _resolve_deadline(request.timeout_seconds, x_request_timeout)
+    
     try:
         # Step 1: Fetch news
-        articles = await news_service.get_top_headlines(
-            category=request.category,
-            country=request.country,
-            page_size=request.count
-        )
+        with span('stage.news', category=request.category, country=request.country):
+            articles = await news_service.get_top_headlines(
+                category=request.category,
+                country=request.country,
+                page_size=request.count,
+                deadline=deadline
+            )
         
         if not articles:
             raise HTTPException(status_code=404, detail="No news articles found")
         
-        # Step 2: Generate scripts for each article
-        scripts = await script_service.generate_multiple_scripts(articles)
-        
-        # Step 3: Generate audio for each script
-        audio_results = await audio_service.generate_multiple_audio(scripts)
-        
-        # Step 4: Fetch videos for each script
-        video_results = await video_service.fetch_multiple_videos(audio_results)
-        
-        # Step 5: Compile final results
-        final_reels = []
-        for result in video_results:
-            reel = {
-                'article': result['article'],
-                'script': result['script_data'],
-                'audio': result['script_data'].get('audio_data'),
-                'videos': result['video_data']['videos'],
-                'reel_data': {
-                    'title': result['article']['title'],
-                    'description': result['article']['description'],
-                    'script': result['script_data']['script'],
-                    'audio_url': result['script_data'].get('audio_data', {}).get('audio_url'),
-                    'video_urls': [v['url'] for v in result['video_data']['videos']],
-                    'duration': result['script_data'].get('estimated_duration', '60 seconds')
-                }
-            }
-            final_reels.append(reel)
-        
-        return {
-            "reels": final_reels,
-            "count": len(final_reels),
-            "status": "success"
-        }
+        # Steps 2-4: Script → Audio → Videos per article, within the time budget
+        reels, statuses = await _run_reel_pipeline(articles, deadline)
+        return json_response(http_request, _reel_response(reels, statuses, deadline, view, selected_fields, target_width))
         
+    except HTTPException:
+        raise
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate-reel/matrix")
+async def generate_reel_matrix(request: MatrixRequest, http_request: Request, view: Optional[str] = None,
+                               fields: Optional[str] = None, device_width: Optional[int] = None,
+                               network: Optional[str] = None, x_request_timeout: Optional[str] = Header(None)):
+    """
+    Reels for every category × country market, building each unique story once
+
+    Headlines for all markets are fetched concurrently and deduplicated across
+    markets, so a story shared by several markets is scripted, voiced and
+    matched to videos once, then listed under each of them.
+    """
+    if not SERVICES_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Reel services not available - API keys required")
+
+    categories = list(dict.fromkeys(request.categories))
+    countries = list(dict.fromkeys(request.countries))
+    markets = [(category, country) for category in categories for country in countries]
+    if not markets:
+        raise HTTPException(status_code=400, detail="categories and countries must each contain at least one entry")
+    if len(markets) > MAX_MATRIX_MARKETS:
+        raise HTTPException(status_code=413, detail=f"Too many markets (max {MAX_MATRIX_MARKETS})")
+
+    view, selected_fields = parse_projection(view, fields)
+    target_width = rendition_target(http_request, device_width, network)
+    deadline = _resolve_deadline(request.timeout_seconds, x_request_timeout)
+
+    # Step 1: headlines for every market at once
+    with span('stage.news', markets=len(markets)):
+        fetched = await asyncio.gather(*(
+            deadline.run(
+                news_service.get_top_headlines(
+                    category=category, country=country, page_size=request.count, deadline=deadline
+                ),
+                stage=f"news for {category}/{country}"
+            )
+            for category, country in markets
+        ), return_exceptions=True)
+
+    market_articles = [result if isinstance(result, list) else [] for result in fetched]
+    unique, market_indexes = _dedupe_markets(market_articles)
+    print(f"🗺️ {len(markets)} markets, {sum(map(len, market_indexes))} market stories, {len(unique)} unique")
+
+    # Step 2: each unique story once, with bounded concurrency
+    statuses = [_article_status(article) for article in unique]
+    used_videos = set()
+
+    async def build(index: int) -> "Reel":
+        article = unique[index]
+        with span('article', title=article.title, markets=sum(index in indexes for indexes in market_indexes)):
+            reel = await _build_reel(article, deadline, statuses[index], used_videos)
+            statuses[index]['stage'] = 'done'
+            return reel
+
+    results = await run_batch(list(range(len(unique))), build, concurrency=BATCH_CONCURRENCY, deadline=deadline)
+    for result in results:
+        if result['status'] != 'success':
+            statuses[result['index']]['status'] = result['status']
+            statuses[result['index']]['error'] = result['error']
+
+    # Step 3: serialize each reel once and fan it out to its markets
+    built = [result for result in results if result['status'] == 'success']
+    projected = project_reels([result['result'] for result in built], view, selected_fields, target_width, _media_url)
+    reel_dicts = {result['index']: data for result, data in zip(built, projected)}
+
+    market_responses = []
+    for (category, country), result, indexes in zip(markets, fetched, market_indexes):
+        reels = [reel_dicts[index] for index in indexes if index in reel_dicts]
+        market = {
+            "category": category,
+            "country": country,
+            "reels": reels,
+            "count": len(reels),
+            "status": "success" if len(reels) == len(indexes) else "partial",
+            "error": None
+        }
+        if isinstance(result, BaseException):
+            market["status"] = "failed"
+            market["error"] = str(result)
+        market_responses.append(market)
+
+    response = {
+        "markets": market_responses,
+        "stories": {
+            "market_stories": sum(map(len, market_indexes)),
+            "unique": len(unique),
+            "built": len(built)
+        },
+        "status": "success" if all(m["status"] == "success" for m in market_responses) else "partial"
+    }
+    if view == "full":
+        response["articles"] = statuses
+        if selected_fields is None:
+            response["deadline"] = {
+                "budget_seconds": deadline.budget_seconds,
+                "elapsed_seconds": deadline.elapsed()
+            }
+    return json_response(http_request, response)
+
+# Media endpoints: range requests, strong ETags and immutable caching for repeat plays and seeks
+@app.get("/media/video/{key}")
+async def get_cached_video(key: str, request: Request):
+    """
+    Serve a cached Pexels video, or redirect to Pexels while it is still being cached
+    """
+    if not SERVICES_AVAILABLE or media_cache is None:
+        raise HTTPException(status_code=404, detail="Media cache is disabled")
+    
+    path = media_cache.cached_path(key)
+    if path:
+        return ranged_file_response(request, path, "video/mp4", etag=f'"{key}"')
+    
+    origin = media_cache.origin_url(key)
+    if not origin:
+        raise HTTPException(status_code=404, detail="Unknown video")
+    media_cache.register(origin)
+    return RedirectResponse(origin, status_code=302)
+
+@app.get("/media/audio/{filename}")
+async def get_audio(filename: str, request: Request):
+    """
+    Serve generated voice-over audio with byte-range support
+    """
+    if not re.fullmatch(r"audio_[0-9a-f]+\.mp3", filename):
+        raise HTTPException(status_code=404, detail="Unknown audio file")
+    
+    path = os.path.join("static", "audio", filename)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Unknown audio file")
+    
+    # Audio files are named by a hash of their voice and text, so the content never changes
+    etag = f'"{filename[:-len(".mp3")]}-{os.path.getsize(path)}"'
+    return ranged_file_response(request, path, "audio/mpeg", etag=etag)
+
 @app.get("/trending-reels")
-async def get_trending_reels():
+async def get_trending_reels(http_request: Request, view: Optional[str] = None, fields: Optional[str] = None,
+                             device_width: Optional[int] = None, network: Optional[str] = None,
+                             x_request_timeout: Optional[str] = Header(None)):
     print("🚀 Hit /trending-reels endpoint")
     
     if not SERVICES_AVAILABLE:
         print("❗ SERVICES_AVAILABLE is False → returning test reels")
         return await get_test_reels()
 
+    view, selected_fields = parse_projection(view, fields)
+    target_width = rendition_target(http_request, device_width, network)
+    deadline = _resolve_deadline(header_timeout=x_request_timeout)
+
     try:
         print("📥 Attempting to call news_service.get_trending_news()...")
 
         if not hasattr(news_service, "get_trending_news"):
             raise Exception("⚠️ 'get_trending_news' method is missing in NewsService class!")
 
-        articles = await news_service.get_trending_news(page_size=10)
+        with span('stage.news'):
+            articles = await news_service.get_trending_news(page_size=10, deadline=deadline)
         print(f"✅ Received {len(articles)} articles")
 
-        # Continue your original logic
-        scripts = await script_service.generate_multiple_scripts(articles)
-        audio_results = await audio_service.generate_multiple_audio(scripts)
-        video_results = await video_service.fetch_multiple_videos(audio_results)
-
-        trending_reels = []
-        for result in video_results:
-            reel = {
-                'article': result['article'],
-                'script': result['script_data'],
-                'audio': result['script_data'].get('audio_data'),
-                'videos': result['video_data']['videos'],
-                'reel_data': {
-                    'title': result['article']['title'],
-                    'description': result['article']['description'],
-                    'script': result['script_data']['script'],
-                    'audio_url': result['script_data'].get('audio_data', {}).get('audio_url'),
-                    'video_urls': [v['url'] for v in result['video_data']['videos']],
-                    'duration': result['script_data'].get('estimated_duration', '60 seconds')
-                }
-            }
-            trending_reels.append(reel)
-
-        return {
-            "reels": trending_reels,
-            "count": len(trending_reels),
-            "status": "success"
-        }
+        reels, statuses = await _run_reel_pipeline(articles, deadline)
+        return json_response(http_request, _reel_response(reels, statuses, deadline, view, selected_fields, target_width))
 
+    except HTTPException:
+        raise
+    except DeadlineExceeded as e:
+        print(f"⏱️ /trending-reels ran out of time: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         print(f"🔥 Exception in /trending-reels: {e}")
         raise HTTPException(status_code=500, detail=str(e))
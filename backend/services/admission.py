@@ -0,0 +1,124 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request cannot be admitted; retry_after is a hint in seconds
+    """
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded concurrency with a bounded FIFO wait queue in front of expensive work
+
+    Up to max_concurrent requests run at once and up to max_queue wait for a
+    slot. A request is rejected straight away when the queue is full, and
+    after max_queue_seconds if no slot has freed up by then, so callers get
+    a fast 503 instead of a slow timeout.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_queue_seconds: float):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_queue_seconds = max_queue_seconds
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of how long an admitted request holds its slot
+        self.avg_service_seconds = 5.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """
+        Seconds until a slot is likely to be free, from the queue length and recent service times
+        """
+        rounds = (self.queued + 1) / self.max_concurrent
+        return min(60, max(1, math.ceil(rounds * self.avg_service_seconds)))
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[float]:
+        """
+        Hold a slot for the duration of the block, yielding the seconds spent queued
+
+        Raises Overloaded when the queue is full or the wait exceeds max_queue_seconds.
+        """
+        queued_at = time.monotonic()
+        await self._acquire()
+        started = time.monotonic()
+        self.admitted += 1
+        try:
+            yield started - queued_at
+        finally:
+            elapsed = time.monotonic() - started
+            self.avg_service_seconds = 0.8 * self.avg_service_seconds + 0.2 * elapsed
+            self._release()
+
+    async def _acquire(self):
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return
+
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("Server is at capacity, try again shortly", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # A released slot is handed over by setting the waiter's result
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_queue_seconds)
+        except asyncio.TimeoutError:
+            if self._abandon(waiter):
+                self.timed_out += 1
+                raise Overloaded("Timed out waiting for capacity, try again shortly", self.retry_after())
+        except BaseException:
+            # Cancelled while queued: give back a slot that was handed over in the meantime
+            if not self._abandon(waiter):
+                self._release()
+            raise
+
+    def _abandon(self, waiter: asyncio.Future) -> bool:
+        """
+        Drop a waiter from the queue; False if it had already been given a slot
+        """
+        if waiter.done():
+            return False
+        waiter.cancel()
+        self._waiters.remove(waiter)
+        return True
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot passes straight to the next waiter, so active is unchanged
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "max_queue_seconds": self.max_queue_seconds,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_service_seconds": round(self.avg_service_seconds, 3)
+        }
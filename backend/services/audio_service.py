@@ -1,8 +1,18 @@
+import asyncio
 import requests
 import os
-from typing import Dict, Any
+import re
+import time
+from typing import List, Optional
 import json
 
+from services.cache import make_cache, make_key
+from services.cassette import cassette_from_env
+from services.deadline import Deadline, deadline_timeout, shared_deadline
+from services.models import AudioAsset, Reel, Script
+from services.mp3 import concat_mp3
+from services.tracing import span
+
 class AudioService:
     def __init__(self):
         self.api_key = os.getenv('ELEVENLABS_API_KEY')
@@ -16,54 +26,162 @@ class AudioService:
             "style": 0.0,
             "use_speaker_boost": True
         }
+        self.timeout = 60
+        # requests itself, or the record/replay store standing in for it
+        self.http = cassette_from_env() or requests
+        
+        # Chunked mode: synthesize sentence groups in parallel and stitch the MP3s
+        self.chunked = os.getenv('TTS_CHUNKED', 'false').lower() == 'true'
+        self.chunk_max_chars = int(os.getenv('TTS_CHUNK_MAX_CHARS', '300'))
+        self.chunk_concurrency = int(os.getenv('TTS_CHUNK_CONCURRENCY', '3'))
+        self.chunk_retries = 2
+        # Index of audio already synthesized, keyed by voice, text and chunking
+        self.cache = make_cache('audio', ttl_seconds=24 * 3600, max_entries=2048)
     
-    async def generate_audio(self, text: str, voice_id: str = None) -> Dict[str, Any]:
+    async def generate_audio(self, text: str, voice_id: str = None, deadline: Optional[Deadline] = None,
+                             chunked: Optional[bool] = None) -> AudioAsset:
         """
         Generate high-quality voice-over audio using ElevenLabs API
         """
+        if not voice_id:
+            voice_id = self.default_voice_id
+        if chunked is None:
+            chunked = self.chunked
+        
+        # Chunked audio is stitched from separate requests, so it is cached apart from a
+        # single-request synthesis of the same text (whose key predates chunking)
+        key = make_key(voice_id, text, 'chunked', self.chunk_max_chars) if chunked else make_key(voice_id, text)
+        cached = await self.cache.aget(key)
+        if cached and not os.path.exists(cached.audio_path):
+            # The file was cleaned up, synthesize it again
+            await self.cache.adelete(key)
+        
+        with span('audio', voice_id=voice_id, chars=len(text), chunked=chunked):
+            return await self.cache.get_or_create(
+                key, lambda: self._synthesize(text, voice_id, key, shared_deadline(), chunked),
+                deadline=deadline, stage="audio synthesis"
+            )
+    
+    async def _synthesize(self, text: str, voice_id: str, key: str, deadline: Optional[Deadline] = None,
+                          chunked: bool = False) -> AudioAsset:
+        """
+        Call ElevenLabs and save the MP3 under static/audio (uncached)
+        """
         try:
-            if not voice_id:
-                voice_id = self.default_voice_id
-            
-            url = f"{self.base_url}/text-to-speech/{voice_id}"
-            
-            headers = {
-                "Accept": "audio/mpeg",
-                "Content-Type": "application/json",
-                "xi-api-key": self.api_key
-            }
+            started = time.monotonic()
+            chunks = self._split_text(text) if chunked else [text]
             
-            data = {
-                "text": text,
-                "model_id": "eleven_monolingual_v1",
-                "voice_settings": self.voice_settings
-            }
-            
-            response = requests.post(url, headers=headers, json=data)
-            response.raise_for_status()
+            if len(chunks) > 1:
+                audio_bytes, duration, chunk_stats = await self._synthesize_chunks(chunks, voice_id, deadline)
+            else:
+                audio_bytes = await self._request_tts(text, voice_id, deadline)
+                duration = self._estimate_duration(text)
+                chunk_stats = None
             
             # Save audio to file
-            audio_filename = f"audio_{hash(text) % 10000}.mp3"
+            audio_filename = f"audio_{key[:16]}.mp3"
             audio_path = f"static/audio/{audio_filename}"
             
             # Ensure directory exists
             os.makedirs("static/audio", exist_ok=True)
             
             with open(audio_path, "wb") as f:
-                f.write(response.content)
+                f.write(audio_bytes)
             
-            return {
-                'audio_url': f"/static/audio/{audio_filename}",
-                'audio_path': audio_path,
-                'duration': self._estimate_duration(text),
-                'voice_id': voice_id,
-                'text_length': len(text)
-            }
+            synthesis = None
+            if chunk_stats is not None:
+                synthesis = {
+                    'mode': 'chunked',
+                    'wall_clock_seconds': round(time.monotonic() - started, 3),
+                    'chunks': chunk_stats
+                }
+                print(f"🔊 Synthesized {len(chunks)} chunks in {synthesis['wall_clock_seconds']}s")
+            
+            return AudioAsset(
+                audio_url=f"/static/audio/{audio_filename}",
+                audio_path=audio_path,
+                duration=duration,
+                voice_id=voice_id,
+                text_length=len(text),
+                synthesis=synthesis
+            )
             
         except Exception as e:
             print(f"Error generating audio: {str(e)}")
             raise e
     
+    async def _request_tts(self, text: str, voice_id: str, deadline: Optional[Deadline] = None) -> bytes:
+        """
+        Synthesize one piece of text and return the MP3 bytes
+        """
+        url = f"{self.base_url}/text-to-speech/{voice_id}"
+        
+        headers = {
+            "Accept": "audio/mpeg",
+            "Content-Type": "application/json",
+            "xi-api-key": self.api_key
+        }
+        
+        data = {
+            "text": text,
+            "model_id": "eleven_monolingual_v1",
+            "voice_settings": self.voice_settings
+        }
+        
+        with span('elevenlabs.tts', chars=len(text)) as request_span:
+            response = await asyncio.to_thread(
+                self.http.post, url, headers=headers, json=data,
+                timeout=deadline_timeout(deadline, self.timeout)
+            )
+            request_span.set(status_code=response.status_code, bytes=len(response.content))
+            response.raise_for_status()
+        return response.content
+    
+    async def _synthesize_chunks(self, chunks: List[str], voice_id: str, deadline: Optional[Deadline] = None) -> tuple:
+        """
+        Synthesize chunks concurrently, retrying each one on its own, and join them in order
+        """
+        semaphore = asyncio.Semaphore(max(1, self.chunk_concurrency))
+        
+        async def synthesize_chunk(index: int, chunk: str):
+            async with semaphore:
+                started = time.monotonic()
+                for attempt in range(1, self.chunk_retries + 2):
+                    try:
+                        audio_bytes = await self._request_tts(chunk, voice_id, deadline)
+                        return audio_bytes, {
+                            'index': index,
+                            'chars': len(chunk),
+                            'attempts': attempt,
+                            'latency_seconds': round(time.monotonic() - started, 3)
+                        }
+                    except Exception as e:
+                        if attempt > self.chunk_retries or (deadline and deadline.expired):
+                            raise
+                        print(f"Retrying TTS chunk {index} after error: {str(e)}")
+        
+        results = await asyncio.gather(*(synthesize_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+        audio_bytes, duration = concat_mp3([result[0] for result in results])
+        return audio_bytes, duration, [result[1] for result in results]
+    
+    def _split_text(self, text: str) -> List[str]:
+        """
+        Split text at sentence boundaries into chunks of at most chunk_max_chars
+        (a single longer sentence becomes its own chunk)
+        """
+        sentences = [s for s in re.split(r'(?<=[.!?])\s+', text.strip()) if s]
+        chunks = []
+        current = ''
+        for sentence in sentences:
+            if current and len(current) + 1 + len(sentence) > self.chunk_max_chars:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        if current:
+            chunks.append(current)
+        return chunks
+    
     async def get_available_voices(self) -> list:
         """
         Get list of available voices
@@ -75,7 +193,7 @@ class AudioService:
                 "xi-api-key": self.api_key
             }
             
-            response = requests.get(url, headers=headers)
+            response = await asyncio.to_thread(self.http.get, url, headers=headers, timeout=self.timeout)
             response.raise_for_status()
             
             data = response.json()
@@ -85,12 +203,12 @@ class AudioService:
             print(f"Error fetching voices: {str(e)}")
             return []
     
-    async def generate_audio_for_script(self, script_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate_audio_for_script(self, script: Script, deadline: Optional[Deadline] = None) -> AudioAsset:
         """
         Generate audio for a complete script
         """
         try:
-            narrator_text = script_data.get('narrator_text', '')
+            narrator_text = script.narrator_text
             
             if not narrator_text:
                 raise Exception("No narrator text found in script")
@@ -99,13 +217,7 @@ class AudioService:
             clean_text = self._prepare_text_for_tts(narrator_text)
             
             # Generate audio
-            audio_data = await self.generate_audio(clean_text)
-            
-            return {
-                'script_data': script_data,
-                'audio_data': audio_data,
-                'status': 'success'
-            }
+            return await self.generate_audio(clean_text, deadline=deadline)
             
         except Exception as e:
             print(f"Error generating audio for script: {str(e)}")
@@ -136,23 +248,19 @@ class AudioService:
         duration_minutes = word_count / 150
         return round(duration_minutes * 60, 2)  # Return in seconds
     
-    async def generate_multiple_audio(self, scripts: list) -> list:
+    async def generate_multiple_audio(self, reels: List[Reel], deadline: Optional[Deadline] = None) -> List[Reel]:
         """
-        Generate audio for multiple scripts
+        Generate audio for multiple scripts, attaching it to each reel
         """
-        audio_results = []
+        audio_reels = []
         
-        for script_item in scripts:
+        for reel in reels:
             try:
-                audio_result = await self.generate_audio_for_script(script_item['script_data'])
-                audio_results.append({
-                    'article': script_item['article'],
-                    'script_data': script_item['script_data'],
-                    'audio_data': audio_result['audio_data']
-                })
+                reel.audio = await self.generate_audio_for_script(reel.script, deadline=deadline)
+                audio_reels.append(reel)
                 
             except Exception as e:
                 print(f"Error generating audio for script: {str(e)}")
                 continue
         
-        return audio_results 
\ No newline at end of file
+        return audio_reels
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from services.deadline import Deadline, DeadlineExceeded
+
+
+async def run_batch(items: List[Any], worker: Callable[[Any], Awaitable[Any]], concurrency: int,
+                    deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
+    """
+    Run worker over items with at most `concurrency` in flight, returning one result per item
+
+    Each result is {'index', 'status', 'result'} on success or {'index', 'status', 'error'}
+    on failure, in the same order as items. One failing item never fails the batch.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_item(index: int, item: Any) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                if deadline:
+                    result = await deadline.run(worker(item), stage=f"batch item {index}")
+                else:
+                    result = await worker(item)
+                return {'index': index, 'status': 'success', 'result': result}
+            except DeadlineExceeded as e:
+                return {'index': index, 'status': 'timeout', 'error': str(e)}
+            except Exception as e:
+                print(f"Error processing batch item {index}: {str(e)}")
+                return {'index': index, 'status': 'failed', 'error': str(e)}
+
+    return await asyncio.gather(*(run_item(index, item) for index, item in enumerate(items)))
+
+
+def batch_response(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Wrap per-item batch results with summary counts
+    """
+    succeeded = sum(1 for result in results if result['status'] == 'success')
+    return {
+        "results": results,
+        "count": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "status": "success" if succeeded == len(results) else "partial"
+    }
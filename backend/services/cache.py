@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.deadline import Deadline
+from services.shared_cache import SQLiteCache
+from services.tracing import annotate
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Build a stable cache key from arbitrary parts
+    """
+    raw = "\x1f".join(str(part) for part in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """
+    Small in-memory LRU cache with per-entry expiry
+
+    Concurrent misses for the same key share a single in-flight call, so a
+    batch that asks for the same item twice only pays for it once.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """
+        get for async callers, matching SQLiteCache, whose lookups leave the event loop
+        """
+        return self.get(key)
+
+    async def adelete(self, key: str):
+        self.delete(key)
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[Any]],
+                            deadline: Optional[Deadline] = None, stage: str = "cached call") -> Any:
+        """
+        Return the cached value for key, or await factory() once and cache its result
+
+        None results and exceptions are not cached. The factory is shared by every
+        concurrent caller, so it must not capture any one caller's deadline; each
+        caller's deadline only bounds its own wait.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            annotate(cache='hit')
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            annotate(cache='miss')
+        else:
+            self.hits += 1
+            annotate(cache='shared')
+
+        # Shield so one caller timing out does not cancel the work other callers share
+        if deadline is None:
+            return await asyncio.shield(task)
+        return await deadline.run(asyncio.shield(task), stage=stage)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        if result is not None:
+            self.set(key, result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+def make_cache(namespace: str, ttl_seconds: float, max_entries: int = 1024):
+    """
+    Cache for one kind of value, in memory or shared across worker processes
+
+    CACHE_BACKEND=sqlite keeps entries in CACHE_PATH so every worker sees (and
+    waits on) the same entries; the default is a per-process TTLCache.
+    """
+    backend = os.getenv("CACHE_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteCache(
+            os.getenv("CACHE_PATH", "data/cache.sqlite3"),
+            namespace=namespace,
+            ttl_seconds=ttl_seconds,
+            max_entries=max_entries
+        )
+    if backend != "memory":
+        raise ValueError("CACHE_BACKEND must be 'memory' or 'sqlite'")
+    return TTLCache(ttl_seconds, max_entries)
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from services.cache import make_key
+from services.tracing import annotate
+
+MODES = ('live', 'record', 'replay')
+
+# Credentials never become part of a cassette key (headers are not keyed at all)
+SECRET_PARAMS = {'apikey', 'api_key', 'key'}
+
+
+class CassetteMiss(Exception):
+    """
+    Raised in replay mode for an upstream call that was never recorded
+    """
+
+
+class CassetteStore:
+    """
+    Record/replay store for upstream HTTP calls and Gemini generations
+
+    In record mode every call goes to the provider and its response is saved;
+    in replay mode calls are answered from the store only, optionally sleeping
+    for the recorded latency. Bodies (JSON, MP3, streamed script chunks) are
+    stored once per sha256 under blobs/, and index.jsonl maps each request key
+    to its status, headers, latency and body hash.
+
+    The get/post methods mirror requests.get/requests.post, so a service can
+    use the store wherever it used the requests module.
+    """
+
+    def __init__(self, directory: str, mode: str = 'replay', simulate_latency: bool = False):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode '{mode}'")
+        self.directory = directory
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+        self.records: Dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'blobs'), exist_ok=True)
+        self._load()
+
+    # HTTP
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+                json: Any = None, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        key = self._http_key(method, url, params, json)
+        if self.mode == 'replay':
+            record = self._replay(key, f"{method} {url}")
+            response = requests.Response()
+            response.status_code = record['status']
+            response.headers = CaseInsensitiveDict(record.get('headers') or {})
+            response._content = self._read_blob(record['body'])
+            response.url = url
+            response.reason = record.get('reason')
+            return response
+
+        started = time.perf_counter()
+        response = requests.request(method, url, params=params, headers=headers, json=json, timeout=timeout, **kwargs)
+        self._record(key, {
+            'kind': 'http',
+            'method': method,
+            'url': url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {'Content-Type': response.headers.get('Content-Type', '')},
+            'latency': round(time.perf_counter() - started, 4),
+            'body': self._write_blob(response.content)
+        })
+        return response
+
+    # Gemini
+
+    def wrap_model(self, model: Any, name: str) -> "RecordedModel":
+        return RecordedModel(self, model, name)
+
+    def generate(self, model: Any, name: str, prompt: str, stream: bool = False):
+        """
+        Recorded generate_content: a chunk iterator when stream is set, otherwise one response
+
+        Streamed and complete generations of the same prompt share a recording.
+        """
+        key = make_key('gemini', name, prompt)
+        if self.mode == 'replay':
+            record = self._replay(key, f"gemini {name}")
+            chunks = json.loads(self._read_blob(record['body']))['chunks']
+            if stream:
+                return self._replay_chunks(chunks)
+            if self.simulate_latency:
+                time.sleep(record['latency'])
+            return SimpleNamespace(text=''.join(text for _, text in chunks))
+
+        if stream:
+            return self._record_chunks(key, name, model.generate_content(prompt, stream=True))
+
+        started = time.perf_counter()
+        response = model.generate_content(prompt)
+        latency = round(time.perf_counter() - started, 4)
+        self._record_generation(key, name, [[latency, response.text]], latency)
+        return response
+
+    def _record_chunks(self, key: str, name: str, live: Iterator[Any]) -> Iterator[Any]:
+        started = time.perf_counter()
+        chunks = []
+        for chunk in live:
+            chunks.append([round(time.perf_counter() - started, 4), chunk.text])
+            yield chunk
+        self._record_generation(key, name, chunks, round(time.perf_counter() - started, 4))
+
+    def _replay_chunks(self, chunks: list) -> Iterator[Any]:
+        started = time.perf_counter()
+        for offset, text in chunks:
+            if self.simulate_latency:
+                time.sleep(max(0.0, offset - (time.perf_counter() - started)))
+            yield SimpleNamespace(text=text)
+
+    def _record_generation(self, key: str, name: str, chunks: list, latency: float):
+        body = json.dumps({'chunks': chunks}).encode('utf-8')
+        self._record(key, {
+            'kind': 'gemini',
+            'model': name,
+            'latency': latency,
+            'body': self._write_blob(body)
+        })
+
+    # Storage
+
+    def _http_key(self, method: str, url: str, params: Optional[dict], body: Any) -> str:
+        params = {k: v for k, v in (params or {}).items() if k.lower() not in SECRET_PARAMS}
+        return make_key(
+            'http', method.upper(), url,
+            json.dumps(params, sort_keys=True, default=str),
+            json.dumps(body, sort_keys=True, default=str)
+        )
+
+    def _replay(self, key: str, description: str) -> dict:
+        record = self.records.get(key)
+        if record is None:
+            self.misses += 1
+            raise CassetteMiss(f"No recording for {description}")
+        self.hits += 1
+        annotate(cassette='replay')
+        if self.simulate_latency and record['kind'] == 'http':
+            time.sleep(record['latency'])
+        return record
+
+    def _record(self, key: str, record: dict):
+        record = {'key': key, **record}
+        with self._lock:
+            self.records[key] = record
+            self.recorded += 1
+            with open(os.path.join(self.directory, 'index.jsonl'), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+        annotate(cassette='record')
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, 'blobs', digest[:2], digest)
+
+    def _write_blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            partial = f"{path}.{threading.get_ident()}.part"
+            with open(partial, 'wb') as f:
+                f.write(data)
+            os.replace(partial, path)
+        return digest
+
+    def _read_blob(self, digest: str) -> bytes:
+        with open(self._blob_path(digest), 'rb') as f:
+            return f.read()
+
+    def _load(self):
+        path = os.path.join(self.directory, 'index.jsonl')
+        if not os.path.exists(path):
+            return
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    # Later recordings of the same request replace earlier ones
+                    self.records[record['key']] = record
+                except (ValueError, KeyError) as e:
+                    print(f"Skipping bad cassette line: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'records': len(self.records),
+            'recorded': self.recorded,
+            'hits': self.hits,
+            'misses': self.misses,
+            'simulate_latency': self.simulate_latency
+        }
+
+
+class RecordedModel:
+    """
+    Stand-in for a Gemini GenerativeModel that records or replays generate_content
+    """
+
+    def __init__(self, store: CassetteStore, model: Any, name: str):
+        self.store = store
+        self.model = model
+        self.name = name
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        return self.store.generate(self.model, self.name, prompt, stream=stream)
+
+
+_store: Optional[CassetteStore] = None
+_store_lock = threading.Lock()
+
+
+def cassette_from_env() -> Optional[CassetteStore]:
+    """
+    The process-wide cassette store selected by UPSTREAM_MODE, or None in live mode
+    """
+    global _store
+    mode = os.getenv('UPSTREAM_MODE', 'live').lower()
+    if mode not in MODES:
+        raise ValueError(f"UPSTREAM_MODE must be one of: {', '.join(MODES)}")
+    if mode == 'live':
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = CassetteStore(
+                directory=os.getenv('CASSETTE_DIR', 'data/cassettes'),
+                mode=mode,
+                simulate_latency=os.getenv('CASSETTE_SIMULATE_LATENCY', 'false').lower() == 'true'
+            )
+            print(f"📼 Upstream {mode} mode using {_store.directory} ({len(_store.records)} recordings)")
+        return _store
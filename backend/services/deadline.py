@@ -0,0 +1,85 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+
+# Upper bound on any request's budget, and the budget for work requests share
+MAX_BUDGET_SECONDS = float(os.getenv("REEL_MAX_DEADLINE_SECONDS", "120"))
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's time budget has run out"""
+
+
+class Deadline:
+    """
+    Time budget for a single API request, shared by every service call it makes
+    """
+
+    # Never hand an upstream call less than this, or it fails before connecting
+    MIN_TIMEOUT = 0.5
+
+    def __init__(self, budget_seconds: float):
+        self.budget_seconds = budget_seconds
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget_seconds
+
+    def remaining(self) -> float:
+        """
+        Seconds left before the deadline (never negative)
+        """
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return round(time.monotonic() - self.started_at, 3)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, stage: str = "request"):
+        """
+        Raise DeadlineExceeded if there is no budget left for the given stage
+        """
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """
+        Timeout to pass to an upstream HTTP call, bounded by the remaining budget
+        """
+        self.check("upstream call")
+        remaining = self.remaining()
+        if cap is not None:
+            remaining = min(remaining, cap)
+        return max(self.MIN_TIMEOUT, remaining)
+
+    async def run(self, awaitable, stage: str = "request"):
+        """
+        Await a coroutine, cancelling it if the deadline passes first
+        """
+        if self.expired:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+        try:
+            return await asyncio.wait_for(awaitable, timeout=self.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Deadline exceeded during {stage}")
+
+
+def deadline_timeout(deadline: Optional[Deadline], default: float) -> float:
+    """
+    Upstream timeout for callers that may or may not have a deadline
+    """
+    if deadline is None:
+        return default
+    return deadline.timeout(cap=default)
+
+
+def shared_deadline() -> Deadline:
+    """
+    Budget for cached work several requests may await, which no one caller's deadline should cut short
+    """
+    return Deadline(MAX_BUDGET_SECONDS)
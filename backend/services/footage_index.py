@@ -0,0 +1,205 @@
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from dataclasses import fields, replace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.models import Rendition, VideoClip
+
+STOPWORDS = {
+    'a', 'an', 'and', 'at', 'by', 'for', 'from', 'in', 'into', 'is', 'of', 'on',
+    'or', 'over', 'the', 'to', 'under', 'with', 'video', 'footage', 'shot', 'scene'
+}
+
+_CLIP_FIELDS = {f.name for f in fields(VideoClip)}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens with stopwords removed and plurals folded
+    """
+    tokens = []
+    for token in re.findall(r'[a-z0-9]+', text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def slug_words(page_url: str) -> str:
+    """
+    Descriptive words from a Pexels page URL such as /video/aerial-view-of-a-city-123/
+    """
+    match = re.search(r'/video/([^/]+)/?$', page_url or '')
+    if not match:
+        return ''
+    return ' '.join(word for word in match.group(1).split('-') if not word.isdigit())
+
+
+class FootageIndex:
+    """
+    Catalogue of every Pexels video we've seen, searchable offline with BM25
+
+    Each clip's document is its tags, the words of its Pexels page slug and every
+    scene prompt Pexels returned it for. The catalogue is appended to a JSONL file
+    so it survives restarts, and rewritten with one line per clip on load when
+    it has gathered redundant lines.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.clips: Dict[int, VideoClip] = {}
+        self.terms: Dict[int, Counter] = {}
+        self.postings: Dict[str, set] = defaultdict(set)
+        self.prompts: Dict[int, set] = defaultdict(set)
+        self.tags: Dict[int, set] = defaultdict(set)
+        self.total_length = 0
+
+        if path and os.path.exists(path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.clips)
+
+    def add(self, clip: VideoClip, tags: Iterable[str] = (), prompt: Optional[str] = None):
+        """
+        Record a clip (or a new prompt for a known clip) and persist it
+        """
+        if clip.id is None:
+            return
+        tags = [tag for tag in dict.fromkeys(tags) if tag not in self.tags[clip.id]]
+        prompts = [prompt] if prompt and prompt not in self.prompts[clip.id] else []
+        if clip.id in self.clips and not tags and not prompts:
+            return
+        self._index(clip, tags, prompts)
+        if self.path:
+            self._append(self._record(clip, tags, prompts))
+
+    def search(self, prompt: str) -> Tuple[Optional[VideoClip], float]:
+        """
+        Best matching clip for prompt and its score in [0, 1]
+        """
+        matches = self.search_many(prompt, limit=1)
+        return matches[0] if matches else (None, 0.0)
+
+    def search_many(self, prompt: str, limit: int = 5) -> List[Tuple[VideoClip, float]]:
+        """
+        Up to limit (clip, score) pairs for prompt, best first
+
+        Candidates are ranked by BM25; each returned score is the share of the
+        query's IDF weight the clip covers, so thresholds stay comparable across
+        prompts of different lengths.
+        """
+        query = list(dict.fromkeys(tokenize(prompt)))
+        if not query or not self.clips:
+            return []
+
+        candidates = set()
+        for term in query:
+            candidates |= self.postings.get(term, set())
+        if not candidates:
+            return []
+
+        avg_length = self.total_length / len(self.clips)
+        ranked = sorted(candidates, key=lambda clip_id: self._bm25(query, clip_id, avg_length), reverse=True)
+
+        total_idf = sum(self._idf(term) for term in query)
+        results = []
+        for clip_id in ranked[:limit]:
+            covered = sum(self._idf(term) for term in query if term in self.terms[clip_id])
+            results.append((self.clips[clip_id], round(covered / total_idf, 3) if total_idf else 0.0))
+        return results
+
+    def _idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.clips)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _bm25(self, query: List[str], clip_id: int, avg_length: float) -> float:
+        terms = self.terms[clip_id]
+        length = sum(terms.values())
+        score = 0.0
+        for term in query:
+            tf = terms.get(term, 0)
+            if not tf:
+                continue
+            norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+            score += self._idf(term) * tf * (self.k1 + 1) / norm
+        return score
+
+    def _index(self, clip: VideoClip, tags: Iterable[str], prompts: Iterable[str]):
+        if clip.id is None:
+            return
+        words = []
+        for tag in tags:
+            if tag not in self.tags[clip.id]:
+                self.tags[clip.id].add(tag)
+                words += tokenize(tag)
+        for prompt in prompts:
+            if prompt not in self.prompts[clip.id]:
+                self.prompts[clip.id].add(prompt)
+                words += tokenize(prompt)
+        if clip.id not in self.clips:
+            self.clips[clip.id] = replace(clip, prompt=None)
+            self.terms[clip.id] = Counter()
+            words += tokenize(slug_words(clip.description))
+
+        self.terms[clip.id].update(words)
+        self.total_length += len(words)
+        for word in words:
+            self.postings[word].add(clip.id)
+
+    def _record(self, clip: VideoClip, tags: List[str], prompts: List[str]) -> dict:
+        return {
+            # The page URL is not part of the API shape, but the slug words come from it
+            'clip': {**clip.to_dict(), 'description': clip.description},
+            'tags': tags,
+            'prompts': prompts,
+            'renditions': [r.to_dict() for r in clip.renditions]
+        }
+
+    def _append(self, record: dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def _load(self):
+        lines = 0
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                    clip_data = {k: v for k, v in record['clip'].items() if k in _CLIP_FIELDS}
+                    clip_data['renditions'] = tuple(Rendition(**r) for r in record.get('renditions') or [])
+                    # Older lines carry a single 'prompt'
+                    prompts = record.get('prompts') or ([record['prompt']] if record.get('prompt') else [])
+                    self._index(VideoClip(**clip_data), record.get('tags') or [], prompts)
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"Skipping bad footage catalogue line: {str(e)}")
+        if lines > len(self.clips):
+            self._compact()
+
+    def _compact(self):
+        """
+        Rewrite the catalogue with one line per clip
+        """
+        partial = f"{self.path}.{os.getpid()}.part"
+        try:
+            with open(partial, 'w', encoding='utf-8') as f:
+                for clip_id, clip in self.clips.items():
+                    record = self._record(clip, sorted(self.tags[clip_id]), sorted(self.prompts[clip_id]))
+                    f.write(json.dumps(record) + '\n')
+            os.replace(partial, self.path)
+        except OSError as e:
+            print(f"Error compacting footage catalogue: {str(e)}")
+            if os.path.exists(partial):
+                os.remove(partial)
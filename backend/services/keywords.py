@@ -0,0 +1,83 @@
+"""
+Lightweight keyword extraction (RAKE-style) for guessing a story's visuals
+"""
+
+import re
+from collections import defaultdict
+from typing import List
+
+STOPWORDS = {
+    'a', 'about', 'after', 'again', 'against', 'all', 'also', 'am', 'an', 'and', 'any', 'are',
+    'as', 'at', 'be', 'because', 'been', 'before', 'being', 'between', 'both', 'but', 'by',
+    'can', 'could', 'did', 'do', 'does', 'doing', 'down', 'during', 'each', 'few', 'for',
+    'from', 'further', 'had', 'has', 'have', 'having', 'he', 'her', 'here', 'hers', 'him',
+    'his', 'how', 'i', 'if', 'in', 'into', 'is', 'it', 'its', 'just', 'may', 'me', 'might',
+    'more', 'most', 'much', 'must', 'my', 'new', 'no', 'nor', 'not', 'now', 'of', 'off', 'on',
+    'once', 'only', 'or', 'other', 'our', 'out', 'over', 'own', 'said', 'same', 'says', 'she',
+    'should', 'so', 'some', 'such', 'than', 'that', 'the', 'their', 'them', 'then', 'there',
+    'these', 'they', 'this', 'those', 'through', 'to', 'too', 'under', 'until', 'up', 'very',
+    'was', 'we', 'were', 'what', 'when', 'where', 'which', 'while', 'who', 'whom', 'why',
+    'will', 'with', 'would', 'you', 'your', 'according', 'report', 'reports', 'reported',
+    'news', 'today', 'yesterday', 'week', 'year', 'years', 'first', 'last', 'one', 'two',
+    'amid', 'via', 'get', 'gets', 'make', 'makes', 'set', 'sets', 'say'
+}
+
+# Phrases longer than this rarely make good stock-footage searches
+MAX_PHRASE_WORDS = 2
+
+
+def _phrases(text: str) -> List[List[str]]:
+    """
+    Split text into candidate phrases: runs of words between stopwords and punctuation
+    """
+    phrases = []
+    for fragment in re.split(r'[.,;:!?()\[\]"“”\-–—|/]+', text.lower()):
+        current = []
+        for word in re.findall(r"[a-z][a-z0-9']*", fragment):
+            word = word.strip("'")
+            if word in STOPWORDS or len(word) < 3:
+                if current:
+                    phrases.append(current)
+                current = []
+            else:
+                current.append(word)
+        if current:
+            phrases.append(current)
+    return [phrase[:MAX_PHRASE_WORDS] for phrase in phrases]
+
+
+def extract_keywords(title: str, description: str = '', limit: int = 3) -> List[str]:
+    """
+    Top keyword phrases for an article, with phrases from the title weighted double
+    """
+    title_phrases = _phrases(title)
+    title_keys = {' '.join(phrase) for phrase in title_phrases}
+    candidates = title_phrases + _phrases(description)
+
+    frequency = defaultdict(int)
+    degree = defaultdict(int)
+    for phrase in candidates:
+        for word in phrase:
+            frequency[word] += 1
+            degree[word] += len(phrase)
+
+    scores = {}
+    for phrase in candidates:
+        key = ' '.join(phrase)
+        if key not in scores:
+            score = sum(degree[word] / frequency[word] for word in phrase)
+            scores[key] = score * 2 if key in title_keys else score
+
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)
+    keywords = []
+    seen_words = set()
+    for key in ranked:
+        # Skip phrases sharing words with a better-ranked one
+        words = set(key.split())
+        if words & seen_words:
+            continue
+        keywords.append(key)
+        seen_words |= words
+        if len(keywords) == limit:
+            break
+    return keywords
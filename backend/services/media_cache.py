@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Dict, Optional
+
+import requests
+
+
+_KEY_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+class MediaCache:
+    """
+    Size-bounded disk cache of Pexels video files served from our own origin
+
+    URLs are registered when a reel response is built; registration starts a
+    background download, and the file is then served locally (with range
+    requests and immutable cache headers) instead of from Pexels. The least
+    recently served files are evicted once the cache grows past max_bytes.
+    Each key's URL is kept in a {key}.json sidecar from registration on, and
+    through eviction, so any worker sharing the directory (or started later)
+    can serve or redirect it. Sidecars are read on demand.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_file_bytes: int = 200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.timeout = 60
+        self.urls: Dict[str, str] = {}
+        self._downloads: Dict[str, asyncio.Task] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def key_for(self, url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp4")
+
+    def register(self, url: str) -> str:
+        """
+        Remember url, start caching it in the background and return its cache key
+        """
+        key = self.key_for(url)
+        if key not in self.urls:
+            self.urls[key] = url
+            # Other worker processes look the key up on disk, so record it before the download
+            self._write_meta(key, {'url': url})
+        if not os.path.exists(self.path_for(key)) and key not in self._downloads:
+            try:
+                task = asyncio.ensure_future(self._download(key, url))
+            except RuntimeError:
+                # No running loop (e.g. called from a worker thread): fetch on first request instead
+                return key
+            self._downloads[key] = task
+            task.add_done_callback(lambda done: self._downloads.pop(key, None))
+        return key
+
+    def cached_path(self, key: str) -> Optional[str]:
+        """
+        Path of the cached file for key, marking it as recently used, or None
+        """
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return None
+        now = time.time()
+        os.utime(path, (now, now))
+        return path
+
+    def origin_url(self, key: str) -> Optional[str]:
+        """
+        The upstream URL registered for key, by this process or any other sharing the directory
+        """
+        url = self.urls.get(key)
+        if url is None:
+            url = self._read_meta(key)
+            if url is not None:
+                self.urls[key] = url
+        return url
+
+    async def _download(self, key: str, url: str):
+        try:
+            await asyncio.to_thread(self._download_sync, key, url)
+            await asyncio.to_thread(self._evict)
+        except Exception as e:
+            print(f"Error caching media {url}: {str(e)}")
+
+    def _download_sync(self, key: str, url: str):
+        path = self.path_for(key)
+        # Per-process name, since several workers may fetch the same video at once
+        partial = f"{path}.{os.getpid()}.part"
+        size = 0
+        try:
+            with requests.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                with open(partial, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=256 * 1024):
+                        size += len(chunk)
+                        if size > self.max_file_bytes:
+                            raise Exception(f"File larger than {self.max_file_bytes} bytes")
+                        f.write(chunk)
+            os.replace(partial, path)
+        finally:
+            # Failed or oversized downloads must not leave their partial file behind
+            if os.path.exists(partial):
+                os.remove(partial)
+        self._write_meta(key, {'url': url, 'size': size})
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _write_meta(self, key: str, meta: dict):
+        # Written whole then renamed, so a reader in another process never sees half a file
+        partial = f"{self._meta_path(key)}.{os.getpid()}.part"
+        try:
+            with open(partial, 'w') as f:
+                json.dump(meta, f)
+            os.replace(partial, self._meta_path(key))
+        except OSError as e:
+            print(f"Error recording media key {key}: {str(e)}")
+
+    def _read_meta(self, key: str) -> Optional[str]:
+        # Keys come from request paths; only ever open files key_for could have named
+        if not _KEY_PATTERN.fullmatch(key):
+            return None
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)['url']
+        except (ValueError, KeyError, OSError):
+            return None
+
+    def _evict(self):
+        """
+        Delete least recently used files until the cache fits in max_bytes
+        """
+        files = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.mp4'):
+                continue
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            # The {key}.json sidecar stays: reels already handed out keep using the key,
+            # and the route redirects to the origin (and refetches) once the file is gone
+            os.remove(path)
+            total -= size
+
+    def stats(self) -> dict:
+        files = [name for name in os.listdir(self.directory) if name.endswith('.mp4')]
+        return {
+            'files': len(files),
+            'bytes': sum(os.path.getsize(os.path.join(self.directory, name)) for name in files),
+            'max_bytes': self.max_bytes,
+            'downloading': len(self._downloads)
+        }
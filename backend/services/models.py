@@ -0,0 +1,252 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Optional hook that maps a media URL to the URL clients should fetch it from
+UrlRewriter = Optional[Callable[[str], str]]
+
+
+@dataclass(slots=True)
+class Article:
+    """
+    A news article as returned by NewsAPI
+    """
+    title: str
+    description: str
+    url: str
+    content: str = ''
+    url_to_image: str = ''
+    published_at: str = ''
+    source: str = 'Unknown'
+    author: str = 'Unknown'
+
+    @classmethod
+    def from_newsapi(cls, raw: Dict[str, Any]) -> Optional["Article"]:
+        """
+        Build an Article from a raw NewsAPI payload, or None if it has no usable content
+        """
+        if not (raw.get('title') and raw.get('description') and raw.get('url')):
+            return None
+        return cls(
+            title=raw['title'],
+            description=raw['description'],
+            url=raw['url'],
+            content=raw.get('content') or '',
+            url_to_image=raw.get('urlToImage') or '',
+            published_at=raw.get('publishedAt') or '',
+            source=(raw.get('source') or {}).get('name', 'Unknown'),
+            author=raw.get('author') or 'Unknown'
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'title': self.title,
+            'description': self.description,
+            'content': self.content,
+            'url': self.url,
+            'urlToImage': self.url_to_image,
+            'publishedAt': self.published_at,
+            'source': self.source,
+            'author': self.author
+        }
+
+
+@dataclass(slots=True)
+class Script:
+    """
+    A generated reel script with the parts later stages need
+    """
+    text: str
+    scenes: Tuple[str, ...]
+    narrator_text: str
+    word_count: int
+    estimated_duration: str = '60 seconds'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'script': self.text,
+            'scenes': list(self.scenes),
+            'narrator_text': self.narrator_text,
+            'word_count': self.word_count,
+            'estimated_duration': self.estimated_duration
+        }
+
+
+@dataclass(slots=True)
+class AudioAsset:
+    """
+    A synthesized voice-over saved under static/audio
+    """
+    audio_url: str
+    audio_path: str
+    duration: float
+    voice_id: str
+    text_length: int
+    synthesis: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'audio_url': self.audio_url,
+            'audio_path': self.audio_path,
+            'duration': self.duration,
+            'voice_id': self.voice_id,
+            'text_length': self.text_length
+        }
+        if self.synthesis is not None:
+            data['synthesis'] = self.synthesis
+        return data
+
+
+@dataclass(slots=True)
+class Rendition:
+    """
+    One encoded file of a Pexels video
+    """
+    url: str
+    width: int
+    height: int
+
+    @property
+    def short_side(self) -> int:
+        return min(self.width, self.height)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'url': self.url, 'width': self.width, 'height': self.height}
+
+
+@dataclass(slots=True)
+class VideoClip:
+    """
+    A Pexels video selected for a scene prompt
+    """
+    id: Optional[int]
+    url: Optional[str]
+    width: Optional[int]
+    height: Optional[int]
+    duration: Optional[int]
+    thumbnail: Optional[str]
+    user: str
+    prompt: Optional[str] = None
+    description: str = ''
+    renditions: Tuple[Rendition, ...] = ()
+
+    def pick_renditions(self, target_width: int) -> List[Rendition]:
+        """
+        Renditions ordered for a client needing target_width pixels on the short side:
+        the smallest one that is wide enough first, then the rest by closeness to the target
+        """
+        if not self.renditions:
+            return []
+        wide_enough = [r for r in self.renditions if r.short_side >= target_width]
+        if wide_enough:
+            selected = min(wide_enough, key=lambda r: r.short_side)
+        else:
+            selected = max(self.renditions, key=lambda r: r.short_side)
+        rest = sorted(
+            (r for r in self.renditions if r is not selected),
+            key=lambda r: (abs(r.short_side - target_width), r.short_side)
+        )
+        return [selected] + rest
+
+    def to_dict(self, target_width: Optional[int] = None, rewrite_url: UrlRewriter = None) -> Dict[str, Any]:
+        data = {
+            'id': self.id,
+            'url': self.url,
+            'width': self.width,
+            'height': self.height,
+            'duration': self.duration,
+            'thumbnail': self.thumbnail,
+            'user': self.user
+        }
+        if target_width:
+            ordered = self.pick_renditions(target_width)
+            if ordered:
+                data.update(ordered[0].to_dict())
+                data['fallbacks'] = [r.to_dict() for r in ordered[1:]]
+        if rewrite_url and data['url']:
+            data['url'] = rewrite_url(data['url'])
+        if self.prompt is not None:
+            data['prompt'] = self.prompt
+            data['description'] = self.description
+        return data
+
+    def url_for(self, target_width: Optional[int] = None, rewrite_url: UrlRewriter = None) -> Optional[str]:
+        url = self.url
+        if target_width and self.renditions:
+            url = self.pick_renditions(target_width)[0].url
+        if rewrite_url and url:
+            url = rewrite_url(url)
+        return url
+
+
+@dataclass(slots=True)
+class Reel:
+    """
+    A reel under construction: each stage fills in its part by reference
+    """
+    article: Article
+    script: Script
+    audio: Optional[AudioAsset] = None
+    videos: List[VideoClip] = field(default_factory=list)
+
+    FIELDS = ('article', 'script', 'audio', 'videos', 'reel_data')
+
+    def to_dict(self, fields: Optional[Iterable[str]] = None, target_width: Optional[int] = None,
+                rewrite_url: UrlRewriter = None) -> Dict[str, Any]:
+        """
+        Serialize the reel into the API response shape, optionally only the given top-level fields
+
+        With target_width, video URLs point at the rendition best suited to that width;
+        rewrite_url maps selected video and audio URLs to where clients should fetch them.
+        """
+        fields = self.FIELDS if fields is None else fields
+        data = {}
+        for name in fields:
+            if name == 'article':
+                data['article'] = self.article.to_dict()
+            elif name == 'script':
+                data['script'] = self.script.to_dict()
+            elif name == 'audio':
+                data['audio'] = self.audio.to_dict() if self.audio else None
+                if data['audio'] and rewrite_url:
+                    data['audio']['audio_url'] = rewrite_url(data['audio']['audio_url'])
+            elif name == 'videos':
+                data['videos'] = [video.to_dict(target_width, rewrite_url) for video in self.videos]
+            elif name == 'reel_data':
+                data['reel_data'] = {
+                    'title': self.article.title,
+                    'description': self.article.description,
+                    'script': self.script.text,
+                    'audio_url': self._audio_url(rewrite_url),
+                    'video_urls': [video.url_for(target_width, rewrite_url) for video in self.videos],
+                    'duration': self.script.estimated_duration
+                }
+        return data
+
+    def to_feed_dict(self, target_width: Optional[int] = None, rewrite_url: UrlRewriter = None) -> Dict[str, Any]:
+        """
+        Serialize the reel into the flat shape the frontend feed renders
+        """
+        data = {
+            'id': self.article.url,
+            'title': self.article.title,
+            'description': self.article.description,
+            'videoUrl': self.videos[0].url_for(target_width, rewrite_url) if self.videos else None,
+            'audioUrl': self._audio_url(rewrite_url),
+            'script': self.script.text,
+            'duration': self.script.estimated_duration,
+            'source': self.article.source,
+            'publishedAt': self.article.published_at
+        }
+        if target_width and self.videos:
+            data['videoFallbacks'] = [r.url for r in self.videos[0].pick_renditions(target_width)[1:]]
+        return data
+
+    @property
+    def audio_url(self) -> Optional[str]:
+        return self.audio.audio_url if self.audio else None
+
+    def _audio_url(self, rewrite_url: UrlRewriter = None) -> Optional[str]:
+        url = self.audio_url
+        if rewrite_url and url:
+            url = rewrite_url(url)
+        return url
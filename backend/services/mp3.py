@@ -0,0 +1,152 @@
+"""
+Minimal MPEG audio frame handling for stitching TTS chunks into one MP3
+"""
+
+from typing import Iterator, List, Optional, Tuple
+
+# Bitrates in kbps indexed by [version_is_mpeg1][layer][bitrate_index]
+_BITRATES = {
+    True: {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    False: {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+
+# Sample rates indexed by version bits (0 = MPEG2.5, 2 = MPEG2, 3 = MPEG1)
+_SAMPLE_RATES = {
+    0: [11025, 12000, 8000],
+    2: [22050, 24000, 16000],
+    3: [44100, 48000, 32000],
+}
+
+
+class Frame:
+    """
+    One MPEG audio frame located inside a byte buffer
+    """
+    __slots__ = ('offset', 'length', 'samples', 'sample_rate', 'side_info_end')
+
+    def __init__(self, offset: int, length: int, samples: int, sample_rate: int, side_info_end: int):
+        self.offset = offset
+        self.length = length
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.side_info_end = side_info_end
+
+
+def _parse_header(data: bytes, offset: int) -> Optional[Frame]:
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version_bits == 3
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[mpeg1][layer][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    mono = ((b3 >> 6) & 0x03) == 3
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or mpeg1:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+
+    # Where a Xing/Info tag would start inside this frame
+    if mpeg1:
+        side_info = 17 if mono else 32
+    else:
+        side_info = 9 if mono else 17
+
+    return Frame(offset, length, samples, sample_rate, offset + 4 + side_info)
+
+
+def _skip_id3v2(data: bytes) -> int:
+    if len(data) >= 10 and data[:3] == b'ID3':
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def iter_frames(data: bytes) -> Iterator[Frame]:
+    """
+    Yield the audio frames in an MP3 buffer, skipping tags and junk between frames
+    """
+    offset = _skip_id3v2(data)
+    end = len(data)
+    if end >= 128 and data[-128:-125] == b'TAG':
+        end -= 128
+
+    while offset + 4 <= end:
+        frame = _parse_header(data, offset)
+        if frame is None or frame.length <= 0 or offset + frame.length > end:
+            offset += 1
+            continue
+        yield frame
+        offset += frame.length
+
+
+def _is_info_frame(data: bytes, frame: Frame) -> bool:
+    tag = data[frame.side_info_end:frame.side_info_end + 4]
+    return tag in (b'Xing', b'Info', b'VBRI')
+
+
+def audio_frames(data: bytes) -> Tuple[bytes, float]:
+    """
+    Strip tags and VBR info frames from an MP3, returning (raw frames, duration in seconds)
+    """
+    parts: List[bytes] = []
+    duration = 0.0
+    for index, frame in enumerate(iter_frames(data)):
+        if index == 0 and _is_info_frame(data, frame):
+            # Its frame count describes this chunk only, so it would be wrong for the joined file
+            continue
+        parts.append(data[frame.offset:frame.offset + frame.length])
+        duration += frame.samples / frame.sample_rate
+    return b''.join(parts), duration
+
+
+def _id3v2_size(size: int) -> bytes:
+    return bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+
+
+def duration_tag(duration_seconds: float) -> bytes:
+    """
+    Build an ID3v2.3 tag holding a TLEN (length in milliseconds) frame
+    """
+    text = b'\x00' + str(int(round(duration_seconds * 1000))).encode('ascii')
+    frame = b'TLEN' + len(text).to_bytes(4, 'big') + b'\x00\x00' + text
+    return b'ID3\x03\x00\x00' + _id3v2_size(len(frame)) + frame
+
+
+def concat_mp3(chunks: List[bytes]) -> Tuple[bytes, float]:
+    """
+    Join MP3 chunks frame by frame into one file with a correct duration tag
+    """
+    bodies = []
+    total = 0.0
+    for chunk in chunks:
+        frames, duration = audio_frames(chunk)
+        bodies.append(frames)
+        total += duration
+    return duration_tag(total) + b''.join(bodies), round(total, 2)
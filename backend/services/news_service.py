@@ -1,17 +1,39 @@
+import asyncio
 import requests
 import os
-from typing import List, Dict, Any
+from typing import List, Optional
 from datetime import datetime, timedelta
 
+from services.cache import make_cache, make_key
+from services.cassette import cassette_from_env
+from services.deadline import Deadline, deadline_timeout, shared_deadline
+from services.models import Article
+from services.tracing import span
+
 class NewsService:
     def __init__(self):
         self.api_key = os.getenv('NEWSAPI_KEY')
         self.base_url = "https://newsapi.org/v2"
+        self.timeout = 10
+        # requests itself, or the record/replay store standing in for it
+        self.http = cassette_from_env() or requests
+        # Headlines change slowly, so every worker reuses a fetch for a few minutes
+        self.cache = make_cache('news', ttl_seconds=float(os.getenv('NEWS_CACHE_SECONDS', '300')), max_entries=256)
     
-    async def get_top_headlines(self, category: str = "general", country: str = "us", page_size: int = 10) -> List[Dict[str, Any]]:
+    async def get_top_headlines(self, category: str = "general", country: str = "us", page_size: int = 10, deadline: Optional[Deadline] = None) -> List[Article]:
         """
         Fetch top headlines from NewsAPI
         """
+        key = make_key('top-headlines', category, country, page_size)
+        return await self.cache.get_or_create(
+            key, lambda: self._fetch_top_headlines(category, country, page_size, shared_deadline()),
+            deadline=deadline, stage="news fetch"
+        )
+    
+    async def _fetch_top_headlines(self, category: str, country: str, page_size: int, deadline: Optional[Deadline] = None) -> List[Article]:
+        """
+        Call NewsAPI for top headlines (uncached)
+        """
         try:
             url = f"{self.base_url}/top-headlines"
             params = {
@@ -21,28 +43,19 @@ class NewsService:
                 'apiKey': self.api_key
             }
             
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+            with span('newsapi.request', endpoint=url.rsplit('/', 1)[-1]) as request_span:
+                response = await asyncio.to_thread(
+                    self.http.get, url, params=params, timeout=deadline_timeout(deadline, self.timeout)
+                )
+                request_span.set(status_code=response.status_code, bytes=len(response.content))
+                response.raise_for_status()
             
             data = response.json()
             
             if data['status'] == 'ok':
-                articles = data['articles']
                 # Filter out articles without content
-                filtered_articles = []
-                for article in articles:
-                    if article.get('title') and article.get('description') and article.get('url'):
-                        filtered_articles.append({
-                            'title': article['title'],
-                            'description': article['description'],
-                            'content': article.get('content', ''),
-                            'url': article['url'],
-                            'urlToImage': article.get('urlToImage', ''),
-                            'publishedAt': article.get('publishedAt', ''),
-                            'source': article.get('source', {}).get('name', 'Unknown'),
-                            'author': article.get('author', 'Unknown')
-                        })
-                return filtered_articles
+                articles = (Article.from_newsapi(raw) for raw in data['articles'])
+                return [article for article in articles if article]
             else:
                 raise Exception(f"NewsAPI error: {data.get('message', 'Unknown error')}")
                 
@@ -50,29 +63,49 @@ class NewsService:
             print(f"Error fetching news: {str(e)}")
             raise e
     
-    async def get_trending_news(self, page_size: int = 10) -> List[Dict[str, Any]]:
+    async def get_trending_news(self, page_size: int = 10, deadline: Optional[Deadline] = None) -> List[Article]:
         """
         Get trending news from multiple categories
         """
+        # An empty snapshot (every category failed) comes back as None so it is not cached
+        articles = await self.cache.get_or_create(
+            make_key('trending', page_size), lambda: self._collect_trending_news(page_size, shared_deadline()),
+            deadline=deadline, stage="news fetch"
+        )
+        return articles or []
+    
+    async def _collect_trending_news(self, page_size: int, deadline: Optional[Deadline] = None) -> Optional[List[Article]]:
         categories = ['technology', 'business', 'entertainment', 'sports', 'science']
         all_articles = []
         
         for category in categories:
             try:
-                articles = await self.get_top_headlines(category=category, page_size=2)
+                with span('news.category', category=category) as category_span:
+                    articles = await self.get_top_headlines(category=category, page_size=2, deadline=deadline)
+                    category_span.set(articles=len(articles))
                 all_articles.extend(articles)
             except Exception as e:
                 print(f"Error fetching {category} news: {str(e)}")
                 continue
         
         # Sort by published date and return top articles
-        all_articles.sort(key=lambda x: x.get('publishedAt', ''), reverse=True)
-        return all_articles[:page_size]
+        all_articles.sort(key=lambda article: article.published_at, reverse=True)
+        return all_articles[:page_size] or None
     
-    async def get_news_by_keyword(self, keyword: str, page_size: int = 10) -> List[Dict[str, Any]]:
+    async def get_news_by_keyword(self, keyword: str, page_size: int = 10, deadline: Optional[Deadline] = None) -> List[Article]:
         """
         Search news by keyword
         """
+        key = make_key('everything', keyword, page_size)
+        return await self.cache.get_or_create(
+            key, lambda: self._search_news(keyword, page_size, shared_deadline()),
+            deadline=deadline, stage="news search"
+        )
+    
+    async def _search_news(self, keyword: str, page_size: int, deadline: Optional[Deadline] = None) -> List[Article]:
+        """
+        Call NewsAPI's search endpoint (uncached)
+        """
         try:
             url = f"{self.base_url}/everything"
             params = {
@@ -83,27 +116,18 @@ class NewsService:
                 'apiKey': self.api_key
             }
             
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+            with span('newsapi.request', endpoint=url.rsplit('/', 1)[-1]) as request_span:
+                response = await asyncio.to_thread(
+                    self.http.get, url, params=params, timeout=deadline_timeout(deadline, self.timeout)
+                )
+                request_span.set(status_code=response.status_code, bytes=len(response.content))
+                response.raise_for_status()
             
             data = response.json()
             
             if data['status'] == 'ok':
-                articles = data['articles']
-                filtered_articles = []
-                for article in articles:
-                    if article.get('title') and article.get('description') and article.get('url'):
-                        filtered_articles.append({
-                            'title': article['title'],
-                            'description': article['description'],
-                            'content': article.get('content', ''),
-                            'url': article['url'],
-                            'urlToImage': article.get('urlToImage', ''),
-                            'publishedAt': article.get('publishedAt', ''),
-                            'source': article.get('source', {}).get('name', 'Unknown'),
-                            'author': article.get('author', 'Unknown')
-                        })
-                return filtered_articles
+                articles = (Article.from_newsapi(raw) for raw in data['articles'])
+                return [article for article in articles if article]
             else:
                 raise Exception(f"NewsAPI error: {data.get('message', 'Unknown error')}")
                 
@@ -0,0 +1,204 @@
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Any, Dict, Optional
+
+# Executor threads blocking calls run on: asyncio.to_thread's and the Gemini pool
+WORKER_THREAD_PREFIXES = ('asyncio_', 'gemini_')
+
+# Innermost frames printed for a blocked loop
+STALL_STACK_DEPTH = 20
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_executor_worker(code) -> bool:
+    filename = code.co_filename.replace(os.sep, '/')
+    return code.co_name == '_worker' and filename.endswith('concurrent/futures/thread.py')
+
+
+def _folded_stack(frame, root: str) -> Optional[str]:
+    """
+    One sample as a 'root;outer;...;inner' line, or None for an idle worker thread
+    """
+    labels = []
+    # An idle executor thread blocks in C on its work queue, so its innermost
+    # Python frame is the executor's _worker loop itself
+    if _is_executor_worker(frame.f_code):
+        return None
+    idle_worker = frame.f_code.co_filename.endswith(('threading.py', 'queue.py'))
+    while frame is not None:
+        if frame.f_code.co_name == '_worker' and idle_worker:
+            return None
+        labels.append(_frame_label(frame).replace(';', ':'))
+        frame = frame.f_back
+    labels.append(root)
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """
+    Statistical profiler sampling the event loop thread and asyncio worker threads
+
+    Stacks are counted in folded form ('a;b;c count'), which flamegraph.pl,
+    speedscope and inferno read directly.
+    """
+
+    def __init__(self, loop_thread_id: int, interval_seconds: float = 0.005):
+        self.loop_thread_id = loop_thread_id
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                name = names.get(thread_id, '')
+                if thread_id == self.loop_thread_id:
+                    root = 'event-loop'
+                elif name.startswith(WORKER_THREAD_PREFIXES):
+                    root = name
+                else:
+                    continue
+                stack = _folded_stack(frame, root)
+                if stack:
+                    self.stacks[stack] += 1
+            self.samples += 1
+
+
+class Profiler:
+    """
+    Opt-in per-request profiling
+
+    A request is profiled when it sends X-Profile with the admin token, or
+    when it is picked at sample_rate. One request is profiled at a time;
+    anything else running on the loop while it is profiled shows up too.
+    """
+
+    def __init__(self, directory: str, admin_token: Optional[str] = None, sample_rate: float = 0.0,
+                 interval_seconds: float = 0.005):
+        self.directory = directory
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.interval_seconds = interval_seconds
+        self.profiles = 0
+        self._active = False
+
+    def wants(self, profile_header: Optional[str]) -> bool:
+        if self._active:
+            return False
+        if self.admin_token and profile_header == self.admin_token:
+            return True
+        return random.random() < self.sample_rate
+
+    def start(self) -> StackSampler:
+        self._active = True
+        sampler = StackSampler(threading.get_ident(), self.interval_seconds)
+        sampler.start()
+        return sampler
+
+    def finish(self, sampler: StackSampler, name: str) -> Optional[str]:
+        """
+        Stop sampling and write the folded stacks, returning the file path
+        """
+        try:
+            stacks = sampler.stop()
+            os.makedirs(self.directory, exist_ok=True)
+            slug = re.sub(r'[^A-Za-z0-9]+', '-', name).strip('-')
+            path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{os.getpid()}.folded")
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            self.profiles += 1
+            print(f"🔥 Profiled {name}: {sampler.samples} samples over {sampler.duration:.2f}s → {path}")
+            return path
+        except Exception as e:
+            print(f"Error writing profile for {name}: {str(e)}")
+            return None
+        finally:
+            self._active = False
+
+
+class LoopBlockDetector:
+    """
+    Watchdog that logs the event loop's stack whenever one callback holds it too long
+
+    A heartbeat task stamps the time every interval; a watchdog thread that sees
+    the stamp go stale by more than threshold_seconds prints what the loop thread
+    is running at that moment, once per stall.
+    """
+
+    def __init__(self, threshold_seconds: float, interval_seconds: float = 0.05):
+        self.threshold_seconds = threshold_seconds
+        self.interval_seconds = min(interval_seconds, threshold_seconds / 2)
+        self.blocks = 0
+        self.longest_seconds = 0.0
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """
+        Start watching the running loop (call from a coroutine on it)
+        """
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._heartbeat = asyncio.ensure_future(self._beat_forever())
+        threading.Thread(target=self._watch, name='loop-block-detector', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.cancel()
+
+    async def _beat_forever(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval_seconds)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval_seconds):
+            beat = self._beat
+            stalled = time.monotonic() - beat
+            # The heartbeat itself sleeps for one interval, so allow for it
+            if stalled - self.interval_seconds < self.threshold_seconds:
+                continue
+            self.longest_seconds = max(self.longest_seconds, stalled)
+            if beat == reported_beat:
+                continue
+            reported_beat = beat
+            self.blocks += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame, limit=STALL_STACK_DEPTH)) if frame else '(no stack)\n'
+            print(f"🐌 Event loop blocked for over {stalled * 1000:.0f}ms, loop thread is in:\n{stack}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'threshold_ms': round(self.threshold_seconds * 1000),
+            'blocks': self.blocks,
+            'longest_ms': round(self.longest_seconds * 1000)
+        }
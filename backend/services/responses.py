@@ -0,0 +1,256 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from services.models import Reel
+
+# Optional fast paths: orjson for encoding, brotli for compression
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+VIEWS = ('full', 'feed')
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 500
+
+# Largest short-side video width worth sending on each network class (None = no cap)
+NETWORK_MAX_WIDTH = {
+    'slow-2g': 240,
+    '2g': 360,
+    '3g': 540,
+    '4g': 1080,
+    'wifi': None
+}
+SAVE_DATA_MAX_WIDTH = 540
+
+# Media files are content-addressed, so they never change under the same URL
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Client hints that change which video renditions a response points at
+CLIENT_HINT_HEADERS = ('Sec-CH-Viewport-Width', 'Viewport-Width', 'Sec-CH-DPR', 'DPR', 'ECT', 'Save-Data')
+
+# One 'first-last' byte range; either side may be empty, but not both
+_BYTE_RANGE = re.compile(r'(\d*)-(\d*)')
+
+
+def parse_projection(view: Optional[str], fields: Optional[str]) -> tuple:
+    """
+    Validate the view/fields query parameters, returning (view, field list or None)
+    """
+    view = view or 'full'
+    if view not in VIEWS:
+        raise HTTPException(status_code=400, detail=f"Unknown view '{view}', expected one of: {', '.join(VIEWS)}")
+
+    if not fields:
+        return view, None
+    if view != 'full':
+        raise HTTPException(status_code=400, detail="fields can only be used with view=full")
+
+    selected = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in Reel.FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields {unknown}, expected any of: {', '.join(Reel.FIELDS)}"
+        )
+    return view, selected
+
+
+def _float_header(request: Request, *names: str) -> Optional[float]:
+    for name in names:
+        value = request.headers.get(name)
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+def rendition_target(request: Request, device_width: Optional[int] = None, network: Optional[str] = None) -> Optional[int]:
+    """
+    Short-side pixel width the client needs, from query parameters or client hint headers
+
+    device_width (or Viewport-Width × DPR) gives the size wanted; network (or the
+    ECT hint) and Save-Data cap it. Returns None when the client sent no hints.
+    """
+    if device_width is None:
+        viewport = _float_header(request, 'sec-ch-viewport-width', 'viewport-width')
+        if viewport:
+            dpr = _float_header(request, 'sec-ch-dpr', 'dpr') or 1.0
+            device_width = int(viewport * dpr)
+
+    network = (network or request.headers.get('ect') or '').lower() or None
+    if network is not None and network not in NETWORK_MAX_WIDTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown network '{network}', expected one of: {', '.join(NETWORK_MAX_WIDTH)}"
+        )
+
+    caps = []
+    if network and NETWORK_MAX_WIDTH[network]:
+        caps.append(NETWORK_MAX_WIDTH[network])
+    if request.headers.get('save-data', '').lower() == 'on':
+        caps.append(SAVE_DATA_MAX_WIDTH)
+
+    if device_width is None and not caps:
+        return None
+    if device_width is None:
+        return min(caps)
+    return min([device_width] + caps)
+
+
+def project_reels(reels: List[Reel], view: str = 'full', fields: Optional[List[str]] = None,
+                  target_width: Optional[int] = None,
+                  rewrite_url: Optional[Callable[[str], str]] = None) -> List[Dict[str, Any]]:
+    """
+    Serialize reels for the requested view, building only the parts that are returned
+    """
+    if view == 'feed':
+        return [reel.to_feed_dict(target_width, rewrite_url) for reel in reels]
+    return [reel.to_dict(fields, target_width, rewrite_url) for reel in reels]
+
+
+def encode_json(payload: Any) -> bytes:
+    """
+    Encode a payload as compact JSON, using orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {
+        part.split(';')[0].strip().lower()
+        for part in accept_encoding.split(',')
+        if not part.strip().endswith(';q=0')
+    }
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def json_response(request: Request, payload: Any, status_code: int = 200) -> Response:
+    """
+    Encode a payload with a strong ETag, answering 304 for matching If-None-Match
+    and compressing with brotli/gzip when the client accepts it
+    """
+    body = encode_json(payload)
+    encoding = None
+    if len(body) >= MIN_COMPRESS_BYTES:
+        encoding = _negotiate_encoding(request.headers.get('accept-encoding', ''))
+
+    # Strong ETags identify one exact representation, so include the encoding
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+    headers = {
+        'ETag': etag,
+        'Vary': ', '.join(('Accept-Encoding',) + CLIENT_HINT_HEADERS),
+        'Accept-CH': ', '.join(CLIENT_HINT_HEADERS[:-1]),
+        'Cache-Control': 'no-cache'
+    }
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+        return Response(status_code=304, headers=headers)
+
+    if encoding == 'br':
+        body = brotli.compress(body)
+    elif encoding == 'gzip':
+        body = gzip.compress(body, compresslevel=6)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    return Response(content=body, status_code=status_code, media_type='application/json', headers=headers)
+
+
+def _parse_range(range_header: str, size: int) -> Optional[tuple]:
+    """
+    Parse a single 'bytes=' range into an inclusive (start, end), or None to send the whole file
+
+    Malformed ranges (including a last byte before the first) are ignored, as
+    RFC 9110 requires. Raises ValueError only for well-formed ranges that
+    cannot be satisfied.
+    """
+    if not range_header.startswith('bytes=') or ',' in range_header:
+        return None
+    match = _BYTE_RANGE.fullmatch(range_header[len('bytes='):].strip())
+    if match is None or not any(match.groups()):
+        return None
+    start_text, end_text = match.groups()
+    if not start_text:
+        suffix = int(end_text)
+        if suffix == 0 or size == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - suffix), size - 1
+    start = int(start_text)
+    if end_text and int(end_text) < start:
+        return None
+    end = int(end_text) if end_text else size - 1
+    if start >= size:
+        raise ValueError("Range outside file")
+    return start, min(end, size - 1)
+
+
+def _file_chunks(path: str, start: int, length: int, chunk_size: int = 256 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(request: Request, path: str, media_type: str, etag: str) -> Response:
+    """
+    Serve a file with byte-range support, a strong ETag and immutable cache headers
+    """
+    size = os.path.getsize(path)
+    headers = {
+        'ETag': etag,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL
+    }
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+
+    if byte_range is None:
+        headers['Content-Length'] = str(size)
+        return StreamingResponse(_file_chunks(path, 0, size), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(length)
+    return StreamingResponse(_file_chunks(path, start, length), status_code=206, media_type=media_type, headers=headers)
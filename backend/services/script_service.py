@@ -1,17 +1,53 @@
+import asyncio
 import google.generativeai as genai
 import os
-from typing import Dict, Any
+from typing import Callable, List, Optional
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services.cache import make_cache, make_key
+from services.cassette import cassette_from_env
+from services.deadline import Deadline, shared_deadline
+from services.models import Article, Reel, Script
+from services.tracing import span
 
 class ScriptService:
     def __init__(self):
         self.api_key = os.getenv('GEMINI_API_KEY')
         genai.configure(api_key=self.api_key)
         self.model = genai.GenerativeModel('gemini-pro')
+        cassette = cassette_from_env()
+        if cassette:
+            self.model = cassette.wrap_model(self.model, 'gemini-pro')
+        # The SDK call blocks its thread until Gemini answers and cannot be cancelled,
+        # so it gets a bounded pool of its own rather than the shared default executor
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('GEMINI_MAX_THREADS', '4')), thread_name_prefix='gemini'
+        )
+        # Scripts for the same story are reused for an hour
+        self.cache = make_cache('scripts', ttl_seconds=3600, max_entries=512)
+        self.scene_pattern = re.compile(r'Scene:\s*([^\n]+)', re.IGNORECASE)
     
-    async def generate_reel_script(self, news_title: str, news_content: str, news_url: str) -> Dict[str, Any]:
+    async def generate_reel_script(self, news_title: str, news_content: str, news_url: str, deadline: Optional[Deadline] = None,
+                                   on_scene: Optional[Callable[[str], None]] = None) -> Script:
         """
         Generate a 1-minute reel script from news content using Gemini API
+
+        If on_scene is given the script is streamed and on_scene is called with each
+        scene description as soon as its line completes, before the script is finished.
+        """
+        key = make_key(news_title, news_content, news_url)
+        with span('script', streamed=on_scene is not None):
+            return await self.cache.get_or_create(
+                key, lambda: self._generate_script(news_title, news_content, news_url, shared_deadline(), on_scene),
+                deadline=deadline, stage="script generation"
+            )
+    
+    async def _generate_script(self, news_title: str, news_content: str, news_url: str, deadline: Optional[Deadline] = None,
+                               on_scene: Optional[Callable[[str], None]] = None) -> Script:
+        """
+        Call Gemini for a new script (uncached)
         """
         try:
             # Create a comprehensive prompt for high-quality script generation
@@ -45,10 +81,20 @@ class ScriptService:
             Focus on the most important aspects of the news story.
             """
             
-            response = self.model.generate_content(prompt)
+            if on_scene:
+                generation = self._stream_script(prompt, on_scene)
+            else:
+                # The Gemini SDK call is blocking, so run it off the event loop
+                generation = self._complete_script(prompt)
+            with span('gemini.generate', stream=on_scene is not None) as request_span:
+                if deadline:
+                    text = await deadline.run(generation, stage="script generation")
+                else:
+                    text = await generation
+                request_span.set(chars=len(text or ''))
             
-            if response.text:
-                script = response.text.strip()
+            if text:
+                script = text.strip()
                 
                 # Extract scenes for video matching
                 scenes = self._extract_scenes(script)
@@ -56,13 +102,13 @@ class ScriptService:
                 # Extract narrator text for audio generation
                 narrator_text = self._extract_narrator_text(script)
                 
-                return {
-                    'script': script,
-                    'scenes': scenes,
-                    'narrator_text': narrator_text,
-                    'word_count': len(script.split()),
-                    'estimated_duration': '60 seconds'
-                }
+                return Script(
+                    text=script,
+                    scenes=tuple(scenes),
+                    narrator_text=narrator_text,
+                    word_count=len(script.split()),
+                    estimated_duration='60 seconds'
+                )
             else:
                 raise Exception("No script generated")
                 
@@ -70,19 +116,71 @@ class ScriptService:
             print(f"Error generating script: {str(e)}")
             raise e
     
+    async def _complete_script(self, prompt: str) -> str:
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(self.executor, self.model.generate_content, prompt)
+        return response.text
+    
+    async def _stream_script(self, prompt: str, on_scene: Callable[[str], None]) -> str:
+        """
+        Stream the script from Gemini, reporting each scene line as soon as it is complete
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stop = threading.Event()
+        
+        def produce():
+            # Runs in a worker thread: the SDK's stream iterator is blocking
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True):
+                    if stop.is_set():
+                        # Nobody is listening any more: free the thread at the next chunk
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+        
+        producer = loop.run_in_executor(self.executor, produce)
+        parts = []
+        pending_line = ''
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                parts.append(item)
+                
+                lines = (pending_line + item).split('\n')
+                pending_line = lines.pop()
+                for line in lines:
+                    for scene in self._extract_scenes(line):
+                        on_scene(scene)
+        finally:
+            stop.set()
+            if not producer.done():
+                producer.cancel()
+        
+        for scene in self._extract_scenes(pending_line):
+            on_scene(scene)
+        return ''.join(parts)
+    
     def _extract_scenes(self, script: str) -> list:
         """
         Extract scene descriptions from the script
         """
-        scene_pattern = r'Scene:\s*([^\n]+)'
-        scenes = re.findall(scene_pattern, script, re.IGNORECASE)
+        scenes = self.scene_pattern.findall(script)
         return [scene.strip() for scene in scenes if scene.strip()]
     
     def _extract_narrator_text(self, script: str) -> str:
         """
         Extract narrator text for audio generation
         """
-        narrator_pattern = r'Narrator:\s*([^]*?)(?=\n\n|Scene:|$)'
+        narrator_pattern = r'Narrator:\s*([\s\S]*?)(?=\n\n|Scene:|$)'
         narrator_matches = re.findall(narrator_pattern, script, re.IGNORECASE)
         
         if narrator_matches:
@@ -94,27 +192,25 @@ class ScriptService:
             # Fallback: return the entire script
             return script
     
-    async def generate_multiple_scripts(self, news_articles: list) -> list:
+    async def generate_multiple_scripts(self, news_articles: List[Article], deadline: Optional[Deadline] = None) -> List[Reel]:
         """
         Generate scripts for multiple news articles
         """
-        scripts = []
+        reels = []
         
         for article in news_articles:
             try:
-                script_data = await self.generate_reel_script(
-                    news_title=article['title'],
-                    news_content=article['description'],
-                    news_url=article['url']
+                script = await self.generate_reel_script(
+                    news_title=article.title,
+                    news_content=article.description,
+                    news_url=article.url,
+                    deadline=deadline
                 )
                 
-                scripts.append({
-                    'article': article,
-                    'script_data': script_data
-                })
+                reels.append(Reel(article=article, script=script))
                 
             except Exception as e:
-                print(f"Error generating script for article '{article['title']}': {str(e)}")
+                print(f"Error generating script for article '{article.title}': {str(e)}")
                 continue
         
-        return scripts 
\ No newline at end of file
+        return reels
@@ -0,0 +1,236 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.deadline import Deadline
+from services.tracing import annotate
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_expiry ON entries (namespace, expires_at);
+CREATE TABLE IF NOT EXISTS leases (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+
+class SQLiteCache:
+    """
+    TTL cache kept in a SQLite file shared by every worker process
+
+    Drop-in for TTLCache (get/set/delete/aget/adelete/get_or_create/stats); values are pickled.
+    Concurrent misses share one in-flight call within a process, and a lease row
+    extends that across processes: the worker holding the lease runs the factory
+    while the others poll for its result, so N workers still make one upstream call.
+
+    get_or_create, aget and adelete do their SQLite work on a single background
+    thread, so a busy database never stalls the event loop; the plain
+    get/set/delete are synchronous and must not be called from the loop. Entries past max_entries are evicted every evict_seconds
+    rather than on every write.
+    """
+
+    def __init__(self, path: str, namespace: str, ttl_seconds: float, max_entries: int = 1024,
+                 lease_seconds: float = 120, poll_seconds: float = 0.1, evict_seconds: float = 30):
+        self.path = path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.evict_seconds = evict_seconds
+        self._last_evict = 0.0
+        self.owner = uuid.uuid4().hex
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each process opens its own
+        if self._conn is None or self._conn_pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._connection().execute(sql, params)
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        """
+        Run a blocking SQLite call on this cache's own thread
+        """
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sqlite-cache-{self.namespace}")
+            self._executor_pid = os.getpid()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._execute(
+            "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < time.time():
+            self.delete(key)
+            return None
+        try:
+            return pickle.loads(value)
+        except Exception as e:
+            # Written by an incompatible version of the code
+            print(f"Dropping unreadable {self.namespace} cache entry: {str(e)}")
+            self.delete(key)
+            return None
+
+    def set(self, key: str, value: Any):
+        self._execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time() + self.ttl_seconds)
+        )
+        if time.monotonic() - self._last_evict >= self.evict_seconds:
+            self._evict()
+
+    def _evict(self):
+        self._last_evict = time.monotonic()
+        # Keep the newest max_entries; the oldest entries are the nearest to expiry anyway
+        self._execute(
+            "DELETE FROM entries WHERE namespace = ? AND key IN ("
+            "SELECT key FROM entries WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_entries)
+        )
+
+    def delete(self, key: str):
+        self._execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await self._run(self.get, key)
+
+    async def adelete(self, key: str):
+        await self._run(self.delete, key)
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[Any]],
+                            deadline: Optional[Deadline] = None, stage: str = "cached call") -> Any:
+        """
+        Return the cached value for key, or produce it once across all processes
+
+        None results and exceptions are not cached. The factory is shared by every
+        concurrent caller, so it must not capture any one caller's deadline; each
+        caller's deadline only bounds its own wait.
+        """
+        value = await self._run(self.get, key)
+        if value is not None:
+            self.hits += 1
+            annotate(cache='hit')
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._create(key, factory))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._inflight.pop(key, None))
+            annotate(cache='miss')
+        else:
+            self.hits += 1
+            annotate(cache='shared')
+
+        # Shield so one caller timing out does not cancel the work other callers share
+        if deadline is None:
+            return await asyncio.shield(task)
+        return await deadline.run(asyncio.shield(task), stage=stage)
+
+    async def _create(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            if await self._run(self._claim, key):
+                try:
+                    value = await factory()
+                    if value is not None:
+                        await self._run(self.set, key, value)
+                    return value
+                finally:
+                    await self._run(self._release, key)
+
+            # Another process is producing this value: wait for it
+            while True:
+                held, value = await self._run(self._poll, key)
+                if value is not None:
+                    annotate(cache='other_process')
+                    return value
+                if not held:
+                    break
+                await asyncio.sleep(self.poll_seconds)
+            # The other process failed or gave up; try to take over
+
+    def _claim(self, key: str) -> bool:
+        now = time.time()
+        self._execute(
+            "DELETE FROM leases WHERE namespace = ? AND key = ? AND expires_at < ?",
+            (self.namespace, key, now)
+        )
+        cursor = self._execute(
+            "INSERT OR IGNORE INTO leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, self.owner, now + self.lease_seconds)
+        )
+        return cursor.rowcount == 1
+
+    def _lease_held(self, key: str) -> bool:
+        row = self._execute(
+            "SELECT expires_at FROM leases WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        ).fetchone()
+        return row is not None and row[0] >= time.time()
+
+    def _poll(self, key: str) -> tuple:
+        """
+        (whether another process still holds the lease, the value if it has been written)
+        """
+        held = self._lease_held(key)
+        return held, self.get(key)
+
+    def _release(self, key: str):
+        self._execute(
+            "DELETE FROM leases WHERE namespace = ? AND key = ? AND owner = ?",
+            (self.namespace, key, self.owner)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._execute(
+            "SELECT COUNT(*) FROM entries WHERE namespace = ? AND expires_at >= ?",
+            (self.namespace, time.time())
+        ).fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "entries": entries,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,190 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    One timed operation inside a request trace
+    """
+    __slots__ = ('name', 'trace', 'span_id', 'parent_id', 'started_at', 'start', 'end', 'status', 'attributes')
+
+    def __init__(self, name: str, trace: Optional["Trace"], parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.status = 'ok'
+        self.attributes = dict(attributes)
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace.trace_id if self.trace else None,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'started_at': round(self.started_at, 6),
+            'duration_ms': round(self.duration * 1000, 2),
+            'status': self.status,
+            'attributes': self.attributes
+        }
+
+
+class Trace:
+    """
+    Every span recorded for one request
+    """
+    __slots__ = ('trace_id', 'spans', 'sampled')
+
+    def __init__(self, sampled: bool):
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+        self.sampled = sampled
+
+    def tree(self) -> List[Dict[str, Any]]:
+        """
+        Spans nested under their parents, roots first
+        """
+        nodes = {span.span_id: {**span.to_dict(), 'children': []} for span in self.spans}
+        roots = []
+        for span in self.spans:
+            parent = nodes.get(span.parent_id)
+            (parent['children'] if parent else roots).append(nodes[span.span_id])
+        return roots
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Record a child span of the current one; outside a trace the span is timed but not kept
+    """
+    parent = _current_span.get()
+    trace = parent.trace if parent else None
+    current = Span(name, trace, parent.span_id if parent else None, attributes)
+    if trace is not None:
+        trace.spans.append(current)
+
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = 'error'
+        current.attributes['error'] = str(e) or type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def annotate(**attributes: Any):
+    """
+    Add attributes to the current span, if any
+    """
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace.trace_id if current and current.trace else None
+
+
+class Tracer:
+    """
+    Builds a span tree per request and exports it to local JSONL files
+
+    A sample_rate share of traces is written span by span to export_path. Any
+    request slower than slow_threshold_seconds is written whole (as a nested
+    tree) to slow_log_path, whether it was sampled or not. Spans still running
+    when their request finishes (background prefetches) are not exported.
+    """
+
+    def __init__(self, export_path: Optional[str], sample_rate: float = 0.1,
+                 slow_threshold_seconds: Optional[float] = None, slow_log_path: Optional[str] = None):
+        self.export_path = export_path
+        self.sample_rate = sample_rate
+        self.slow_threshold_seconds = slow_threshold_seconds
+        self.slow_log_path = slow_log_path
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.slow = 0
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        Start a new trace whose root span covers the block
+        """
+        trace = Trace(sampled=random.random() < self.sample_rate)
+        root = Span(name, trace, None, attributes)
+        trace.spans.append(root)
+
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.status = 'error'
+            root.attributes['error'] = str(e) or type(e).__name__
+            raise
+        finally:
+            root.end = time.perf_counter()
+            _current_span.reset(token)
+            self._export(trace, root)
+
+    def _export(self, trace: Trace, root: Span):
+        try:
+            if trace.sampled and self.export_path:
+                finished = [s.to_dict() for s in trace.spans if s.end is not None]
+                self._append(self.export_path, finished)
+                self.exported += 1
+
+            if self.slow_threshold_seconds is not None and root.duration >= self.slow_threshold_seconds:
+                self.slow += 1
+                print(f"🐢 Slow request {root.name} took {root.duration:.1f}s (trace {trace.trace_id})")
+                if self.slow_log_path:
+                    self._append(self.slow_log_path, [{
+                        'trace_id': trace.trace_id,
+                        'name': root.name,
+                        'duration_ms': round(root.duration * 1000, 2),
+                        'logged_at': time.time(),
+                        'spans': trace.tree()
+                    }])
+        except Exception as e:
+            # Tracing must never break the request it describes
+            print(f"Error exporting trace {trace.trace_id}: {str(e)}")
+
+    def _append(self, path: str, records: List[Dict[str, Any]]):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lines = ''.join(json.dumps(record, default=str) + '\n' for record in records)
+        with self._lock:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sample_rate': self.sample_rate,
+            'exported': self.exported,
+            'slow_threshold_seconds': self.slow_threshold_seconds,
+            'slow': self.slow
+        }
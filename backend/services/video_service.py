@@ -1,25 +1,69 @@
+import asyncio
 import requests
 import os
-from typing import List, Dict, Any
+from typing import Any, Dict, List, Optional, Set
 import random
+import re
+from dataclasses import replace
+
+from services.cache import make_cache, make_key
+from services.cassette import cassette_from_env
+from services.deadline import Deadline, deadline_timeout, shared_deadline
+from services.footage_index import FootageIndex, tokenize
+from services.keywords import extract_keywords
+from services.models import Article, Reel, Rendition, Script, VideoClip
+from services.tracing import annotate, span
 
 class VideoService:
     def __init__(self):
         self.api_key = os.getenv('PEXELS_API_KEY')
         self.base_url = "https://api.pexels.com/videos"
-        
-    async def fetch_videos(self, prompts: List[str]) -> List[Dict[str, Any]]:
+        self.timeout = 15
+        # requests itself, or the record/replay store standing in for it
+        self.http = cassette_from_env() or requests
+        # Search results per scene prompt
+        self.cache = make_cache('videos', ttl_seconds=6 * 3600, max_entries=4096)
+        # Local catalogue of footage already seen, matched before asking Pexels
+        self.index = None
+        if os.getenv('FOOTAGE_INDEX', 'true').lower() == 'true':
+            self.index = FootageIndex(os.getenv('FOOTAGE_CATALOGUE_PATH', 'data/footage_catalogue.jsonl'))
+        self.match_threshold = float(os.getenv('FOOTAGE_MATCH_THRESHOLD', '0.75'))
+        self.index_hits = 0
+        # Several results per search so reels sharing a prompt can get different clips
+        self.per_page = int(os.getenv('PEXELS_PER_PAGE', '5'))
+        self.search_concurrency = 4
+        self.upstream_calls = 0
+        # Background prefetches, kept referenced until they finish
+        self._prefetches = set()
+        # Speculative keyword searches started while scripts are generated, and how many paid off
+        self.speculative_queries = 3
+        self.speculation = {'prefetched': 0, 'used': 0, 'unused': 0}
+
+    async def fetch_videos(self, prompts: List[str], deadline: Optional[Deadline] = None,
+                           exclude: Optional[Set[int]] = None, fallbacks: Optional[List[Optional[str]]] = None,
+                           served: Optional[Set[str]] = None) -> List[VideoClip]:
         """
         Fetch relevant videos from Pexels API based on scene prompts
+
+        Clips whose ids are in exclude are avoided when another candidate exists;
+        the ids picked here are added to it, so a shared set keeps clips distinct
+        across reels. fallbacks optionally gives, per prompt, a query whose results
+        are extra candidates when the prompt's own results are empty or all excluded;
+        fallbacks that supply a clip are added to served.
         """
         try:
             videos = []
+            used = exclude if exclude is not None else set()
+            fallbacks = fallbacks or [None] * len(prompts)
             
-            for prompt in prompts:
+            for prompt, fallback in zip(prompts, fallbacks):
                 try:
-                    video_data = await self._fetch_single_video(prompt)
+                    video_data = await self._fetch_single_video(
+                        prompt, deadline=deadline, exclude=used, fallback=fallback, served=served
+                    )
                     if video_data:
                         videos.append(video_data)
+                        used.add(video_data.id)
                 except Exception as e:
                     print(f"Error fetching video for prompt '{prompt}': {str(e)}")
                     continue
@@ -30,10 +74,122 @@ class VideoService:
             print(f"Error fetching videos: {str(e)}")
             raise e
     
-    async def _fetch_single_video(self, prompt: str) -> Dict[str, Any]:
+    def prefetch_video(self, prompt: str) -> asyncio.Task:
+        """
+        Start fetching videos for prompt in the background
+
+        The results land in the search cache, so a later fetch for the same prompt
+        reuses them (or joins the in-flight request) instead of calling Pexels again.
+        The prefetch runs under the shared budget, not the deadline of the request
+        that started it, since any request may end up using it.
+        """
+        task = asyncio.ensure_future(self._prefetch(prompt))
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetches.discard)
+        return task
+    
+    async def _prefetch(self, prompt: str):
+        # Nobody awaits a prefetch, so its errors are logged here rather than lost
+        try:
+            await self._search_videos(prompt, deadline=shared_deadline())
+        except Exception as e:
+            print(f"Error prefetching videos for '{prompt}': {str(e)}")
+    
+    def speculative_prefetch(self, article: Article) -> List[str]:
+        """
+        Warm the search cache with keyword queries guessed from the article
+
+        Called while the article's script is still being generated; the queries are
+        reconciled with the real scenes in fetch_videos_for_script.
+        """
+        queries = extract_keywords(article.title, article.description, limit=self.speculative_queries)
+        for query in queries:
+            self.prefetch_video(query)
+        self.speculation['prefetched'] += len(queries)
+        return queries
+    
+    def _reconcile_speculation(self, scenes: List[str], speculative: List[str], served: Set[str]) -> List[Optional[str]]:
+        """
+        Fallback query for each scene: a speculative query whose words all appear in the scene
+
+        Scenes are always searched with their own, more specific query. A speculative
+        query that normalizes to a scene's query is that search's prefetch, so it is
+        added to served straight away.
+        """
+        normalized = {self._normalize_prompt(scene) for scene in scenes}
+        fallbacks = []
+        for scene in scenes:
+            scene_words = set(tokenize(scene))
+            fallbacks.append(next((q for q in speculative if set(tokenize(q)) <= scene_words), None))
+        served.update(q for q in speculative if self._normalize_prompt(q) in normalized)
+        return fallbacks
+    
+    def _record_speculation(self, speculative: List[str], served: Set[str]):
+        used = len(set(speculative) & served)
+        self.speculation['used'] += used
+        self.speculation['unused'] += len(speculative) - used
+        annotate(speculative_queries=len(speculative), speculative_used=used)
+        print(f"🔮 Speculative prefetch: {used}/{len(speculative)} queries supplied clips")
+    
+    async def _fetch_single_video(self, prompt: str, deadline: Optional[Deadline] = None,
+                                  exclude: Optional[Set[int]] = None, fallback: Optional[str] = None,
+                                  served: Optional[Set[str]] = None) -> Optional[VideoClip]:
+        """
+        Fetch a single video for a given prompt, preferring clips not in exclude
+
+        fallback's results are only consulted when the prompt's own give no usable clip.
+        """
+        exclude = exclude or set()
+        try:
+            candidates = await self._search_videos(prompt, deadline=deadline) or []
+        except Exception:
+            if not fallback:
+                raise
+            candidates = []
+        clip = next((c for c in candidates if c.id not in exclude), None)
+        if clip is None and fallback:
+            extra = await self._search_videos(fallback, deadline=deadline) or []
+            clip = next((c for c in extra if c.id not in exclude), None)
+            if clip is not None and served is not None:
+                served.add(fallback)
+            candidates = candidates or extra
+        if clip is None:
+            if not candidates:
+                return None
+            clip = candidates[0]
+        return replace(clip, prompt=prompt)
+    
+    def _normalize_prompt(self, prompt: str) -> str:
+        """
+        Normalize a prompt so trivially different spellings share one search
+        """
+        return ' '.join(re.findall(r'[a-z0-9]+', prompt.lower()))
+    
+    async def _search_videos(self, prompt: str, deadline: Optional[Deadline] = None) -> List[VideoClip]:
         """
-        Fetch a single video for a given prompt
+        Candidate videos for a prompt, cached per normalized prompt
         """
+        query = self._normalize_prompt(prompt) or prompt
+        key = make_key(query)
+        with span('video.search', query=query):
+            return await self.cache.get_or_create(
+                key, lambda: self._search_uncached(query, shared_deadline()), deadline=deadline, stage="video search"
+            )
+    
+    async def _search_uncached(self, prompt: str, deadline: Optional[Deadline] = None) -> Optional[List[VideoClip]]:
+        """
+        Find videos for the prompt in the local catalogue, or search Pexels
+        """
+        if self.index is not None:
+            matches = [
+                clip for clip, score in self.index.search_many(prompt, limit=self.per_page)
+                if score >= self.match_threshold
+            ]
+            annotate(index_hit=bool(matches))
+            if matches:
+                self.index_hits += 1
+                return matches
+        
         try:
             url = f"{self.base_url}/search"
             headers = {
@@ -41,69 +197,102 @@ class VideoService:
             }
             params = {
                 "query": prompt,
-                "per_page": 1,
+                "per_page": self.per_page,
                 "orientation": "portrait",  # For mobile-first content
                 "size": "medium"  # Good quality, reasonable file size
             }
             
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
+            self.upstream_calls += 1
+            with span('pexels.search', query=prompt) as request_span:
+                response = await asyncio.to_thread(
+                    self.http.get, url, headers=headers, params=params,
+                    timeout=deadline_timeout(deadline, self.timeout)
+                )
+                request_span.set(status_code=response.status_code, bytes=len(response.content))
+                response.raise_for_status()
             
             data = response.json()
             
-            if data.get('videos') and len(data['videos']) > 0:
-                video = data['videos'][0]
-                
+            clips = []
+            for video in data.get('videos', []):
                 # Get the best quality video file
                 video_files = video.get('video_files', [])
-                if video_files:
-                    # Prefer HD quality, fallback to any available
-                    hd_video = next((vf for vf in video_files if vf.get('width', 0) >= 1280), None)
-                    selected_video = hd_video or video_files[0]
-                    
-                    return {
-                        'id': video.get('id'),
-                        'url': selected_video.get('link'),
-                        'width': selected_video.get('width'),
-                        'height': selected_video.get('height'),
-                        'duration': video.get('duration'),
-                        'prompt': prompt,
-                        'thumbnail': video.get('image'),
-                        'user': video.get('user', {}).get('name', 'Unknown'),
-                        'description': video.get('url', '')
-                    }
+                if not video_files:
+                    continue
+                
+                # Prefer HD quality, fallback to any available
+                hd_video = next((vf for vf in video_files if vf.get('width', 0) >= 1280), None)
+                selected_video = hd_video or video_files[0]
+                
+                clip = VideoClip(
+                    id=video.get('id'),
+                    url=selected_video.get('link'),
+                    width=selected_video.get('width'),
+                    height=selected_video.get('height'),
+                    duration=video.get('duration'),
+                    thumbnail=video.get('image'),
+                    user=video.get('user', {}).get('name', 'Unknown'),
+                    prompt=prompt,
+                    description=video.get('url', ''),
+                    renditions=self._renditions(video_files)
+                )
+                if self.index is not None:
+                    tags = [tag.get('name', '') if isinstance(tag, dict) else str(tag) for tag in video.get('tags', [])]
+                    self.index.add(clip, tags=tags, prompt=prompt)
+                clips.append(clip)
             
-            return None
+            return clips
             
         except Exception as e:
             print(f"Error fetching single video: {str(e)}")
             return None
     
-    async def fetch_videos_for_script(self, script_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def fetch_videos_for_script(self, script: Script, deadline: Optional[Deadline] = None,
+                                      exclude: Optional[Set[int]] = None,
+                                      speculative: Optional[List[str]] = None) -> List[VideoClip]:
         """
         Fetch videos for all scenes in a script
+
+        speculative lists keyword queries prefetched for this script (see speculative_prefetch).
         """
         try:
-            scenes = script_data.get('scenes', [])
-            
-            if not scenes:
-                # If no scenes found, create generic prompts from script
-                script_text = script_data.get('script', '')
-                scenes = self._extract_generic_prompts(script_text)
+            if speculative and not script.scenes:
+                # No scenes: the article keywords beat random generic prompts
+                self._record_speculation(speculative, set(speculative))
+                return await self.fetch_videos(speculative, deadline=deadline, exclude=exclude)
             
-            videos = await self.fetch_videos(scenes)
+            scenes = self._scene_prompts(script)
+            if not speculative:
+                return await self.fetch_videos(scenes, deadline=deadline, exclude=exclude)
             
-            return {
-                'script_data': script_data,
-                'videos': videos,
-                'scene_count': len(scenes),
-                'video_count': len(videos)
-            }
+            served = set()
+            fallbacks = self._reconcile_speculation(scenes, speculative, served)
+            videos = await self.fetch_videos(scenes, deadline=deadline, exclude=exclude, fallbacks=fallbacks, served=served)
+            self._record_speculation(speculative, served)
+            return videos
             
         except Exception as e:
             print(f"Error fetching videos for script: {str(e)}")
             raise e
     
+    def _renditions(self, video_files: List[dict]) -> tuple:
+        """
+        Every usable file Pexels sent for a video, smallest first
+        """
+        renditions = [
+            Rendition(url=vf['link'], width=vf['width'], height=vf['height'])
+            for vf in video_files
+            if vf.get('link') and vf.get('width') and vf.get('height')
+        ]
+        return tuple(sorted(renditions, key=lambda r: r.short_side))
+    
+    def _scene_prompts(self, script: Script) -> List[str]:
+        scenes = list(script.scenes)
+        if not scenes:
+            # If no scenes found, create generic prompts from script
+            scenes = self._extract_generic_prompts(script.text)
+        return scenes
+    
     def _extract_generic_prompts(self, script_text: str) -> List[str]:
         """
         Extract generic video prompts from script text
@@ -121,7 +310,21 @@ class VideoService:
         # Return a subset of generic prompts
         return random.sample(generic_prompts, min(3, len(generic_prompts)))
     
-    async def fetch_trending_videos(self, category: str = "nature", per_page: int = 5) -> List[Dict[str, Any]]:
+    def stats(self) -> Dict[str, Any]:
+        """
+        Search counters, including how often speculative prefetches supplied clips
+        """
+        decided = self.speculation['used'] + self.speculation['unused']
+        return {
+            'upstream_calls': self.upstream_calls,
+            'index_hits': self.index_hits,
+            'speculation': {
+                **self.speculation,
+                'hit_rate': round(self.speculation['used'] / decided, 3) if decided else None
+            }
+        }
+    
+    async def fetch_trending_videos(self, category: str = "nature", per_page: int = 5) -> List[VideoClip]:
         """
         Fetch trending videos from Pexels
         """
@@ -134,7 +337,9 @@ class VideoService:
                 "per_page": per_page
             }
             
-            response = requests.get(url, headers=headers, params=params)
+            response = await asyncio.to_thread(
+                self.http.get, url, headers=headers, params=params, timeout=self.timeout
+            )
             response.raise_for_status()
             
             data = response.json()
@@ -144,15 +349,15 @@ class VideoService:
                 video_files = video.get('video_files', [])
                 if video_files:
                     selected_video = video_files[0]
-                    videos.append({
-                        'id': video.get('id'),
-                        'url': selected_video.get('link'),
-                        'width': selected_video.get('width'),
-                        'height': selected_video.get('height'),
-                        'duration': video.get('duration'),
-                        'thumbnail': video.get('image'),
-                        'user': video.get('user', {}).get('name', 'Unknown')
-                    })
+                    videos.append(VideoClip(
+                        id=video.get('id'),
+                        url=selected_video.get('link'),
+                        width=selected_video.get('width'),
+                        height=selected_video.get('height'),
+                        duration=video.get('duration'),
+                        thumbnail=video.get('image'),
+                        user=video.get('user', {}).get('name', 'Unknown')
+                    ))
             
             return videos
             
@@ -160,23 +365,48 @@ class VideoService:
             print(f"Error fetching trending videos: {str(e)}")
             return []
     
-    async def fetch_multiple_videos(self, scripts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def search_prompts(self, prompts: List[str], deadline: Optional[Deadline] = None):
+        """
+        Search every prompt of a batch up front, so the batch's fetches are cache hits
+
+        Prompts are normalized and deduplicated first, and each unique query is
+        searched once, at most search_concurrency at a time.
+        """
+        unique_prompts = {}
+        for prompt in prompts:
+            unique_prompts.setdefault(self._normalize_prompt(prompt) or prompt, prompt)
+        
+        semaphore = asyncio.Semaphore(self.search_concurrency)
+        
+        async def search(prompt: str):
+            async with semaphore:
+                try:
+                    await self._search_videos(prompt, deadline=deadline)
+                except Exception as e:
+                    print(f"Error searching videos for '{prompt}': {str(e)}")
+        
+        await asyncio.gather(*(search(prompt) for prompt in unique_prompts.values()))
+        print(f"🎬 {len(prompts)} scene prompts, {len(unique_prompts)} unique searches")
+    
+    async def fetch_multiple_videos(self, reels: List[Reel], deadline: Optional[Deadline] = None) -> List[Reel]:
         """
-        Fetch videos for multiple scripts
+        Fetch videos for multiple scripts, attaching them to each reel
+
+        Reels sharing a prompt get different clips where the results allow it.
         """
-        video_results = []
+        prompts_by_reel = [self._scene_prompts(reel.script) for reel in reels]
+        await self.search_prompts([prompt for prompts in prompts_by_reel for prompt in prompts], deadline=deadline)
+        
+        video_reels = []
+        used = set()
         
-        for script_item in scripts:
+        for reel, prompts in zip(reels, prompts_by_reel):
             try:
-                video_result = await self.fetch_videos_for_script(script_item['script_data'])
-                video_results.append({
-                    'article': script_item['article'],
-                    'script_data': script_item['script_data'],
-                    'video_data': video_result
-                })
+                reel.videos = await self.fetch_videos(prompts, deadline=deadline, exclude=used)
+                video_reels.append(reel)
                 
             except Exception as e:
                 print(f"Error fetching videos for script: {str(e)}")
                 continue
         
-        return video_results 
\ No newline at end of file
+        return video_reels
@@ -3,15 +3,25 @@
 Quick start script for Factually News Reels API
 """
 
+import argparse
+import signal
+import threading
+import time
 import uvicorn
 import os
 from dotenv import load_dotenv
+from uvicorn._subprocess import get_subprocess
 
 # Load environment variables
 load_dotenv()
 
 def check_environment():
     """Check if all required environment variables are set"""
+    if os.getenv('UPSTREAM_MODE', 'live').lower() == 'replay':
+        # Every upstream call is answered from the cassette store, so no keys are needed
+        print("📼 Replay mode: API keys are not required")
+        return True
+    
     required_vars = [
         'NEWSAPI_KEY',
         'GEMINI_API_KEY', 
@@ -34,7 +44,86 @@ def check_environment():
     print("✅ All environment variables are set!")
     return True
 
+class WorkerSupervisor:
+    """
+    Run N uvicorn worker processes on one shared listening socket
+
+    Dead workers are replaced. SIGHUP rolls the workers one at a time: a
+    replacement starts accepting on the shared socket before the old worker
+    gets SIGTERM, and uvicorn lets the old one finish in-flight requests
+    (up to the graceful timeout), so a restart drops no connections.
+    SIGINT/SIGTERM stop every worker the same graceful way.
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int, warmup_seconds: float = 3.0):
+        self.config = config
+        self.workers = workers
+        self.warmup_seconds = warmup_seconds
+        self.graceful_seconds = (config.timeout_graceful_shutdown or 30) + 5
+        self.processes = []
+        self.should_exit = threading.Event()
+        self.should_restart = threading.Event()
+
+    def run(self):
+        sock = self.config.bind_socket()
+        signal.signal(signal.SIGINT, lambda *_: self.should_exit.set())
+        signal.signal(signal.SIGTERM, lambda *_: self.should_exit.set())
+        signal.signal(signal.SIGHUP, lambda *_: self.should_restart.set())
+
+        print(f"👷 Supervisor {os.getpid()} starting {self.workers} workers (SIGHUP for a rolling restart)")
+        self.processes = [self._spawn(sock) for _ in range(self.workers)]
+
+        while not self.should_exit.wait(0.5):
+            if self.should_restart.is_set():
+                self.should_restart.clear()
+                self._rolling_restart(sock)
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    print(f"⚠️ Worker {process.pid} exited with code {process.exitcode}, replacing it")
+                    self.processes[index] = self._spawn(sock)
+
+        print("🛑 Stopping workers...")
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            self._join(process)
+        sock.close()
+
+    def _spawn(self, sock):
+        server = uvicorn.Server(config=self.config)
+        process = get_subprocess(config=self.config, target=server.run, sockets=[sock])
+        process.start()
+        return process
+
+    def _rolling_restart(self, sock):
+        print("🔄 Rolling restart")
+        for index, old in enumerate(list(self.processes)):
+            self.processes[index] = self._spawn(sock)
+            time.sleep(self.warmup_seconds)
+            old.terminate()
+            self._join(old)
+            if self.should_exit.is_set():
+                return
+
+    def _join(self, process):
+        process.join(self.graceful_seconds)
+        if process.is_alive():
+            print(f"⚠️ Worker {process.pid} did not stop in time, killing it")
+            process.kill()
+            process.join()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Start the Factually News Reels API")
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")),
+        help="Worker processes; more than 1 starts production mode (default: WEB_CONCURRENCY or 1)"
+    )
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     print("🚀 Starting Factually News Reels API...")
     print("=" * 50)
     
@@ -43,9 +132,9 @@ def main():
         return
     
     print("\n📡 Server will be available at:")
-    print("   - API: http://localhost:8000")
-    print("   - Docs: http://localhost:8000/docs")
-    print("   - ReDoc: http://localhost:8000/redoc")
+    print(f"   - API: http://localhost:{args.port}")
+    print(f"   - Docs: http://localhost:{args.port}/docs")
+    print(f"   - ReDoc: http://localhost:{args.port}/redoc")
     
     print("\n🎯 Available endpoints:")
     print("   - GET  /health - Health check")
@@ -60,11 +149,25 @@ def main():
     print("Press Ctrl+C to stop")
     print("=" * 50)
     
+    if args.workers > 1:
+        # Production mode: no reload, caches shared between workers
+        os.environ.setdefault("CACHE_BACKEND", "sqlite")
+        config = uvicorn.Config(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            log_level="info",
+            timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "30"))
+        )
+        WorkerSupervisor(config, args.workers, float(os.getenv("WORKER_WARMUP_SECONDS", "3"))).run()
+        return
+    
     # Start the server
     uvicorn.run(
         "main:app",
-        host="0.0.0.0",
-        port=8000,
+        host=args.host,
+        port=args.port,
         reload=True,
         log_level="info"
     )
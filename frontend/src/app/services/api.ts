@@ -24,7 +24,7 @@ export class ApiService {
   static async getTrendingReels(): Promise<NewsReel[]> {
     try {
       console.log('Fetching from:', `${API_BASE_URL}/trending-reels`);
-      const response = await fetch(`${API_BASE_URL}/trending-reels`);
+      const response = await fetch(`${API_BASE_URL}/trending-reels?view=feed`);
       
       console.log('Response status:', response.status);
       
@@ -57,7 +57,7 @@ export class ApiService {
 
   static async generateCustomReel(category: string = 'technology'): Promise<NewsReel | null> {
     try {
-      const response = await fetch(`${API_BASE_URL}/generate-reel`, {
+      const response = await fetch(`${API_BASE_URL}/generate-reel?view=feed`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',